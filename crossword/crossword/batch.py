@@ -0,0 +1,146 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+from crossword import *
+from generate import CrosswordCreator
+
+# Word table shared by every puzzle a worker process generates
+TABLE = None
+
+
+def main():
+
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(
+        usage="python batch.py structures words [--images DIR]",
+        description=(
+            "Generate a crossword for every structure in a directory or "
+            "manifest, writing one JSON line per puzzle."
+        )
+    )
+    parser.add_argument(
+        "structures",
+        help="directory of .txt structures, or file listing one per line"
+    )
+    parser.add_argument("words")
+    parser.add_argument(
+        "--images", metavar="DIR",
+        help="also save an image of each puzzle into this directory"
+    )
+    parser.add_argument(
+        "--format", choices=["png", "svg"], default="png",
+        help="image format for --images (default: png)"
+    )
+    parser.add_argument(
+        "--cell-size", type=int, default=100,
+        help="size of each grid cell in pixels, e.g. 20 for thumbnails"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(),
+        help="number of worker processes (default: one per core)"
+    )
+    args = parser.parse_args()
+
+    if args.images:
+        os.makedirs(args.images, exist_ok=True)
+    images = None
+    if args.images:
+        images = (args.images, args.format, args.cell_size)
+    jobs = [
+        (structure, images)
+        for structure in load_structures(args.structures)
+    ]
+
+    # Load the dictionary once and share it with every worker
+    table = WordTable.load(args.words)
+    with multiprocessing.Pool(
+        args.workers, initializer=init_worker, initargs=(table,)
+    ) as pool:
+        for result in pool.imap_unordered(generate, jobs):
+            print(json.dumps(result), flush=True)
+
+
+def load_structures(path):
+    """
+    Return list of structure files named by `path`, which is either a
+    directory of `.txt` files or a manifest listing one path per line,
+    relative to the manifest. In a directory, `.txt` files without any
+    open `_` cells, such as word lists, are skipped.
+    """
+    if os.path.isdir(path):
+        return [
+            os.path.join(path, filename)
+            for filename in sorted(os.listdir(path))
+            if filename.endswith(".txt")
+            and is_structure(os.path.join(path, filename))
+        ]
+    with open(path) as f:
+        return [
+            os.path.join(os.path.dirname(path), line.strip())
+            for line in f
+            if line.strip() and not line.startswith("#")
+        ]
+
+
+def is_structure(path):
+    """Return True if the file at `path` has any open `_` cells."""
+    with open(path) as f:
+        return any("_" in line for line in f)
+
+
+def init_worker(table):
+    global TABLE
+    TABLE = table
+
+
+def generate(job):
+    """
+    Generate one crossword and return a JSON-serializable result with its
+    status, the time it took, and the filled grid if there is one.
+    """
+    structure, images = job
+    result = {"structure": structure}
+    start = time.perf_counter()
+    try:
+        crossword = Crossword(structure, TABLE)
+        creator = CrosswordCreator(crossword)
+        assignment = creator.solve()
+        result["seconds"] = time.perf_counter() - start
+        if assignment is None:
+            result["status"] = "unsolvable"
+        else:
+            result["status"] = "solved"
+            result["grid"] = grid_rows(creator, assignment)
+            if images:
+                directory, extension, cell_size = images
+                name = os.path.splitext(os.path.basename(structure))[0]
+                result["image"] = os.path.join(
+                    directory, f"{name}.{extension}"
+                )
+                creator.save(assignment, result["image"], cell_size)
+    except Exception as e:
+        result["seconds"] = time.perf_counter() - start
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def grid_rows(creator, assignment):
+    """
+    Return the filled grid as a list of strings, with `#` for blocks.
+    """
+    letters = creator.letter_grid(assignment)
+    return [
+        "".join(
+            (letters[i][j] or " ") if creator.crossword.structure[i][j] else "#"
+            for j in range(creator.crossword.width)
+        )
+        for i in range(creator.crossword.height)
+    ]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from crossword import *
+from generate import CrosswordCreator
+
+SIZES = [5, 7, 9]
+DENSITIES = [0.2, 0.3]
+SYMMETRIES = ["none", "rotational", "mirror"]
+DICTIONARY_SIZES = [1000, 3000]
+
+# Searches expanding more nodes than this are stopped and reported as such
+NODE_LIMIT = 2000
+
+
+class NodeLimitReached(Exception):
+    pass
+
+
+def main():
+
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(
+        usage="python benchmark.py [output] [--compare baseline]",
+        description=(
+            "Solve synthetic crosswords over a matrix of grid sizes, block "
+            "densities, symmetries and dictionary sizes, and record time, "
+            "nodes and peak memory for each case as JSON."
+        )
+    )
+    parser.add_argument("output", nargs="?", help="file to write results to")
+    parser.add_argument(
+        "--compare", metavar="BASELINE",
+        help="report cases that got slower or expanded more nodes"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25,
+        help="allowed relative slowdown before a case is reported"
+    )
+    parser.add_argument(
+        "--words", default=os.path.join("data", "words2.txt"),
+        help="word list to sample dictionaries from"
+    )
+    parser.add_argument(
+        "--memory", action="store_true",
+        help="also record peak memory, in a second, much slower run"
+    )
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument(
+        "--densities", type=float, nargs="+", default=DENSITIES
+    )
+    parser.add_argument(
+        "--symmetries", nargs="+", default=SYMMETRIES, choices=SYMMETRIES
+    )
+    parser.add_argument(
+        "--dictionaries", type=int, nargs="+", default=DICTIONARY_SIZES
+    )
+    args = parser.parse_args()
+
+    with open(args.words) as f:
+        vocabulary = sorted(set(f.read().upper().splitlines()))
+
+    results = list()
+    for size in args.sizes:
+        for density in args.densities:
+            for symmetry in args.symmetries:
+                for words in args.dictionaries:
+                    for seed in range(args.seeds):
+                        case = {
+                            "size": size,
+                            "density": density,
+                            "symmetry": symmetry,
+                            "words": words,
+                            "seed": seed
+                        }
+                        case.update(run_case(vocabulary, args.memory, **case))
+                        print(format_case(case), flush=True)
+                        results.append(case)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cases": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["cases"]
+        regressions = compare(baseline, results, args.tolerance)
+        for message in regressions:
+            print(message)
+        print(f"{len(regressions)} regression(s)")
+
+
+def generate_grid(size, density, symmetry, rng):
+    """
+    Return list of rows for a `size` by `size` structure, with `_` for
+    open cells and `#` for blocks. Each cell is a block with probability
+    `density`; with `rotational` or `mirror` symmetry, blocks are copied
+    to the cell opposite through the center or across the vertical axis.
+    """
+    grid = [[False] * size for _ in range(size)]
+    for i in range(size):
+        for j in range(size):
+            if rng.random() >= density:
+                continue
+            grid[i][j] = True
+            if symmetry == "rotational":
+                grid[size - 1 - i][size - 1 - j] = True
+            elif symmetry == "mirror":
+                grid[i][size - 1 - j] = True
+    return [
+        "".join("#" if block else "_" for block in row)
+        for row in grid
+    ]
+
+
+def sample_dictionary(vocabulary, size, rng):
+    """
+    Return a random sample of `size` words, or the whole vocabulary if it
+    is smaller than that.
+    """
+    return rng.sample(vocabulary, min(size, len(vocabulary)))
+
+
+def run_case(vocabulary, memory, size, density, symmetry, words, seed):
+    """
+    Generate and solve one synthetic crossword, and return its status,
+    time to solve, node and backtrack counts, and, if `memory` is true,
+    peak memory in bytes.
+    """
+    rng = random.Random(f"{size}-{density}-{symmetry}-{words}-{seed}")
+    rows = generate_grid(size, density, symmetry, rng)
+    table = WordTable(sample_dictionary(vocabulary, words, rng))
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write("\n".join(rows))
+    try:
+        crossword = Crossword(f.name, table)
+    finally:
+        os.remove(f.name)
+
+    result = {"variables": len(crossword.variables)}
+    creator, seconds, status = solve(crossword)
+    result["status"] = status
+    result["seconds"] = seconds
+    result["nodes"] = creator.stats.nodes
+    result["backtracks"] = creator.stats.backtracks
+    result["peak_memory"] = None
+    if not memory:
+        return result
+
+    # Measure memory in a separate run, since tracing slows the solver down
+    tracemalloc.start()
+    try:
+        solve(crossword)
+        result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+def solve(crossword):
+    """
+    Solve a crossword with statistics enabled, stopping after
+    `NODE_LIMIT` nodes. Return the creator, time taken and status.
+    """
+    def check_limit(var, value, assignment):
+        if creator.stats.nodes > NODE_LIMIT:
+            raise NodeLimitReached
+
+    creator = CrosswordCreator(crossword, stats=True, on_assign=check_limit)
+    start = time.perf_counter()
+    try:
+        assignment = creator.solve()
+        status = "solved" if assignment is not None else "unsolvable"
+    except NodeLimitReached:
+        status = "limit"
+    return creator, time.perf_counter() - start, status
+
+
+def format_case(case):
+    text = (
+        f"size={case['size']} density={case['density']} "
+        f"symmetry={case['symmetry']} words={case['words']} "
+        f"seed={case['seed']}: {case['status']} "
+        f"in {case['seconds']:.4f}s, {case['nodes']} nodes"
+    )
+    if case["peak_memory"] is not None:
+        text += f", {case['peak_memory'] / 1024:.0f} KiB"
+    return text
+
+
+def compare(baseline, results, tolerance):
+    """
+    Return list of messages describing cases in `results` that took more
+    than `1 + tolerance` times as long as in `baseline`, expanded more
+    nodes, or changed status.
+    """
+    def key(case):
+        return tuple(
+            case[field]
+            for field in ("size", "density", "symmetry", "words", "seed")
+        )
+
+    previous = {key(case): case for case in baseline}
+    messages = list()
+    for case in results:
+        old = previous.get(key(case))
+        if old is None:
+            continue
+        name = format_case(case)
+        if case["status"] != old["status"]:
+            messages.append(f"{name} (was {old['status']})")
+        elif case["nodes"] > old["nodes"]:
+            messages.append(f"{name} (was {old['nodes']} nodes)")
+        elif case["seconds"] > old["seconds"] * (1 + tolerance):
+            messages.append(f"{name} (was {old['seconds']:.4f}s)")
+    return messages
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,12 @@
+import hashlib
+import json
+import mmap
+import os
+import sys
+
+# Directory for compiled word tables, keyed by the hash of the words file
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "crossword")
+
 class Variable():
 
     ACROSS = "across"
@@ -35,9 +44,221 @@ class Variable():
         return f"Variable({self.i}, {self.j}, {direction}, {self.length})"
 
 
+class WordTable():
+
+    MAGIC = b"WORDTABLE1\n"
+
+    def __init__(self, words=()):
+        """
+        Bucket a vocabulary by word length.
+
+        Within a bucket, each word is identified by its position in the
+        sorted bucket, so a set of words of one length can be stored as an
+        integer bitset with bit `n` standing for `words(length)[n]`.
+        """
+        buckets = dict()
+        for word in words:
+            buckets.setdefault(len(word), []).append(sys.intern(word))
+        self.buckets = {
+            length: tuple(sorted(bucket))
+            for length, bucket in buckets.items()
+        }
+        self.ids = dict()
+        self.letter_masks = dict()
+
+        # Compiled file the table is read from, if any (see `open`)
+        self.path = None
+        self.header = dict()
+        self.data = None
+        self.base = 0
+
+    @classmethod
+    def compile(cls, words_file, cache_dir=CACHE_DIR):
+        """
+        Compile a words file into `cache_dir`, unless a compiled copy of
+        the same contents is already there, and return the path to it.
+        """
+        with open(words_file, "rb") as f:
+            contents = f.read()
+        digest = hashlib.sha256(contents).hexdigest()
+        path = os.path.join(cache_dir, f"{digest}.words")
+        if not os.path.exists(path):
+            cls.parse(contents).save(path)
+        return path
+
+    @classmethod
+    def load(cls, words_file, cache_dir=CACHE_DIR):
+        """
+        Return table for a words file, going through the compiled cache in
+        `cache_dir`. If `cache_dir` is None, parse the words file directly.
+        """
+        if cache_dir is None:
+            with open(words_file, "rb") as f:
+                return cls.parse(f.read())
+        return cls.open(cls.compile(words_file, cache_dir))
+
+    @classmethod
+    def parse(cls, contents):
+        """Return table for the raw contents of a words file."""
+        return cls(set(contents.decode().upper().splitlines()))
+
+    @classmethod
+    def open(cls, path):
+        """
+        Return table backed by a memory map of a file written by `save`.
+        Buckets and masks are only decoded when they are first used.
+        """
+        table = cls()
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        start = len(cls.MAGIC)
+        if data[:start] != cls.MAGIC:
+            raise ValueError(f"{path} is not a compiled word table")
+        size = int.from_bytes(data[start:start + 8], "little")
+        start += 8
+        header = json.loads(data[start:start + size])
+        table.path = path
+        table.header = {int(length): entry for length, entry in header.items()}
+        table.data = data
+        table.base = start + size
+        return table
+
+    def save(self, path):
+        """
+        Write the table to `path` as a header followed by each bucket's
+        words and the bytes of its letter masks.
+        """
+        header = dict()
+        sections = list()
+        offset = 0
+        for length in sorted(self.lengths()):
+            data = "\n".join(self.words(length)).encode()
+            entry = {"words": [offset, len(data)], "masks": []}
+            sections.append(data)
+            offset += len(data)
+            for position in self.masks(length):
+                spans = dict()
+                for letter, mask in sorted(position.items()):
+                    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+                    spans[letter] = [offset, len(data)]
+                    sections.append(data)
+                    offset += len(data)
+                entry["masks"].append(spans)
+            header[length] = entry
+        header = json.dumps(header).encode()
+
+        # Write to a temporary file first so that readers never see a
+        # partially written table
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(self.MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for data in sections:
+                f.write(data)
+        os.replace(temporary, path)
+
+    def __getstate__(self):
+        # A memory map cannot be pickled, so tables read from a compiled
+        # file are pickled as the path to reopen
+        if self.path is not None:
+            return {"path": self.path}
+        return self.__dict__
+
+    def __setstate__(self, state):
+        if "buckets" not in state:
+            state = WordTable.open(state["path"]).__dict__
+        self.__dict__.update(state)
+
+    def section(self, span):
+        """Return bytes of the compiled file at an [offset, size] span."""
+        start = self.base + span[0]
+        return self.data[start:start + span[1]]
+
+    def lengths(self):
+        """Return set of word lengths in the table."""
+        return set(self.buckets) | set(self.header)
+
+    def vocabulary(self):
+        """Return set of all words in the table."""
+        return set(
+            word for length in self.lengths() for word in self.words(length)
+        )
+
+    def words(self, length):
+        """Return tuple of all words with the given length."""
+        if length not in self.buckets:
+            if length not in self.header:
+                return ()
+            text = self.section(self.header[length]["words"]).decode()
+            self.buckets[length] = tuple(
+                sys.intern(word) for word in text.split("\n")
+            )
+        return self.buckets[length]
+
+    def full(self, length):
+        """Return bitset of all words with the given length."""
+        return (1 << len(self.words(length))) - 1
+
+    def bit(self, word):
+        """Return bitset containing only `word`."""
+        length = len(word)
+        if length not in self.ids:
+            self.ids[length] = {
+                word: n for n, word in enumerate(self.words(length))
+            }
+        return 1 << self.ids[length][word]
+
+    def masks(self, length):
+        """
+        Return list of dicts for words with the given length, where
+        `masks(length)[k][letter]` is the bitset of words with `letter`
+        at position `k`. Masks are built the first time they are needed.
+        """
+        if length in self.letter_masks:
+            return self.letter_masks[length]
+        if length in self.header:
+            self.letter_masks[length] = [
+                {
+                    letter: int.from_bytes(self.section(span), "little")
+                    for letter, span in spans.items()
+                }
+                for spans in self.header[length]["masks"]
+            ]
+        else:
+            words = self.words(length)
+            positions = [dict() for _ in range(length)]
+            for n, word in enumerate(words):
+                for k, letter in enumerate(word):
+                    positions[k].setdefault(letter, []).append(n)
+            self.letter_masks[length] = [
+                {
+                    letter: bitset(ids, len(words))
+                    for letter, ids in position.items()
+                }
+                for position in positions
+            ]
+        return self.letter_masks[length]
+
+    def decode(self, length, domain):
+        """Return list of the words in a bitset of words of given length."""
+        words = self.words(length)
+        bits = bin(domain)[:1:-1]
+        return [words[n] for n, bit in enumerate(bits) if bit == "1"]
+
+
+def bitset(ids, size):
+    """Return integer with bit `n` set for every `n` in `ids`."""
+    bits = bytearray((size + 7) // 8)
+    for n in ids:
+        bits[n >> 3] |= 1 << (n & 7)
+    return int.from_bytes(bits, "little")
+
+
 class Crossword():
 
-    def __init__(self, structure_file, words_file):
+    def __init__(self, structure_file, words_file, cache_dir=CACHE_DIR):
 
         # Determine structure of crossword
         with open(structure_file) as f:
@@ -57,9 +278,12 @@ class Crossword():
                         row.append(False)
                 self.structure.append(row)
 
-        # Save vocabulary list
-        with open(words_file) as f:
-            self.words = set(f.read().upper().splitlines())
+        # Load vocabulary, compiling it into `cache_dir` on first use,
+        # unless an already loaded table was passed in as `words_file`
+        if isinstance(words_file, WordTable):
+            self.table = words_file
+        else:
+            self.table = WordTable.load(words_file, cache_dir)
 
         # Determine variable set
         self.variables = set()
@@ -105,29 +329,61 @@ class Crossword():
                         ))
 
         # Compute overlaps for each word
-        # For any pair of variables v1, v2, their overlap is either:
-        #    None, if the two variables do not overlap; or
+        # For any pair of overlapping variables v1, v2, their overlap is
         #    (i, j), where v1's ith character overlaps v2's jth character
+        # Pairs that do not overlap are not stored, so look them up with
+        # `self.overlaps.get((v1, v2))`, which gives None
+        cell_variables = dict()
+        for var in self.variables:
+            for k, cell in enumerate(var.cells):
+                cell_variables.setdefault(cell, []).append((var, k))
         self.overlaps = dict()
-        for v1 in self.variables:
-            for v2 in self.variables:
-                if v1 == v2:
-                    continue
-                cells1 = v1.cells
-                cells2 = v2.cells
-                intersection = set(cells1).intersection(cells2)
-                if not intersection:
-                    self.overlaps[v1, v2] = None
-                else:
-                    intersection = intersection.pop()
-                    self.overlaps[v1, v2] = (
-                        cells1.index(intersection),
-                        cells2.index(intersection)
-                    )
+        adjacency = {var: [] for var in self.variables}
+        for entries in cell_variables.values():
+            for v1, k1 in entries:
+                for v2, k2 in entries:
+                    if v1 != v2:
+                        self.overlaps[v1, v2] = (k1, k2)
+                        adjacency[v1].append(v2)
+        self.adjacency = {
+            var: tuple(neighbors) for var, neighbors in adjacency.items()
+        }
+
+    def symmetries(self):
+        """
+        Return list of functions mapping a cell (i, j) to its image under
+        each rotation or reflection of the grid, including the identity,
+        that maps the structure onto itself.
+        """
+        h, w = self.height - 1, self.width - 1
+        candidates = [
+            lambda i, j: (i, j),
+            lambda i, j: (h - i, w - j),
+            lambda i, j: (h - i, j),
+            lambda i, j: (i, w - j)
+        ]
+        if self.height == self.width:
+            candidates.extend([
+                lambda i, j: (j, i),
+                lambda i, j: (w - j, h - i),
+                lambda i, j: (j, h - i),
+                lambda i, j: (w - j, i)
+            ])
+        return [
+            symmetry for symmetry in candidates
+            if all(
+                self.structure[i][j] == self.structure[k][m]
+                for i in range(self.height)
+                for j in range(self.width)
+                for k, m in [symmetry(i, j)]
+            )
+        ]
+
+    @property
+    def words(self):
+        """Set of all words in the vocabulary."""
+        return self.table.vocabulary()
 
     def neighbors(self, var):
-        """Given a variable, return set of overlapping variables."""
-        return set(
-            v for v in self.variables
-            if v != var and self.overlaps[v, var]
-        )
+        """Given a variable, return tuple of overlapping variables."""
+        return self.adjacency[var]
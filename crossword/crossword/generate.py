@@ -1,19 +1,110 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+import queue
+import random
 import sys
+import time
+
+from collections import deque
 
 from crossword import *
+from render import default_renderer
+
+
+class SearchLimitReached(Exception):
+    pass
+
+
+class SolverStats():
+
+    def __init__(self):
+        """
+        Counters and timings collected by a `CrosswordCreator`.
+
+        Times are in seconds; `search_time` includes the arc consistency
+        maintained during search, while `ac3_time` only covers the initial
+        pass made by `solve`.
+        """
+        self.nodes = 0
+        self.backtracks = 0
+        self.revisions = 0
+        self.pruned = 0
+        self.node_consistency_time = 0
+        self.ac3_time = 0
+        self.search_time = 0
+
+    def __str__(self):
+        return "\n".join([
+            f"Nodes expanded: {self.nodes}",
+            f"Backtracks: {self.backtracks}",
+            f"Revise calls: {self.revisions}",
+            f"Values pruned: {self.pruned}",
+            f"Node consistency: {self.node_consistency_time:.4f}s",
+            f"AC-3: {self.ac3_time:.4f}s",
+            f"Search: {self.search_time:.4f}s"
+        ])
 
 
 class CrosswordCreator():
 
-    def __init__(self, crossword):
+    def __init__(self, crossword, mac=True, seed=None, stats=False,
+                 on_assign=None, on_unassign=None, backjump=False):
         """
         Create new CSP crossword generate.
+
+        Each domain is an integer bitset over the words of the variable's
+        length in `crossword.table`; use `domain_words` to list its words.
+        If `mac` is true, arc consistency is maintained after every
+        assignment during search rather than only enforced up front.
+        If `seed` is given, ties in variable and value ordering are broken
+        randomly using that seed instead of arbitrarily.
+        If `backjump` is true, the search uses forward checking with
+        conflict-directed backjumping and nogood learning instead (see
+        `backjump`), and `mac` is ignored.
+
+        If `stats` is true, `self.stats` is a `SolverStats` updated as the
+        solver runs; otherwise it is None. `on_assign(var, value,
+        assignment)` and `on_unassign(var, assignment)` are called, if
+        given, whenever the search assigns or unassigns a variable.
         """
         self.crossword = crossword
+        self.table = crossword.table
         self.domains = {
-            var: self.crossword.words.copy()
+            var: self.table.full(var.length)
             for var in self.crossword.variables
         }
+        self.mac = mac
+
+        # Previous domains, as (var, domain) pairs, so that they can be
+        # restored when the search backtracks
+        self.trail = list()
+
+        # Words used by the current partial assignment
+        self.used_words = set()
+
+        self.random = random.Random(seed) if seed is not None else None
+
+        # Number of nodes the search may still expand before restarting
+        self.node_budget = None
+
+        self.stats = SolverStats() if stats else None
+        self.on_assign = on_assign
+        self.on_unassign = on_unassign
+
+        self.backjumping = backjump
+
+        # For backjumping: the assigned variables that pruned each domain,
+        # in order, and a trail of the variables they were recorded for
+        self.pruned_by = {var: list() for var in self.crossword.variables}
+        self.explained = list()
+
+        # Learned nogoods: values that can never be used, as (var, word)
+        # pairs, and for each (var, word) the (var, word) pairs it cannot
+        # be combined with. They stay valid across restarts.
+        self.dead_values = set()
+        self.nogoods = dict()
 
     def letter_grid(self, assignment):
         """
@@ -44,88 +135,184 @@ class CrosswordCreator():
                     print("█", end="")
             print()
 
-    def save(self, assignment, filename):
+    def save(self, assignment, filename, cell_size=100):
         """
-        Save crossword assignment to an image file.
+        Save crossword assignment to an image file, or to an SVG file if
+        `filename` ends in `.svg`. Small `cell_size` values give thumbnails.
         """
-        from PIL import Image, ImageDraw, ImageFont
-        cell_size = 100
-        cell_border = 2
-        interior_size = cell_size - 2 * cell_border
-        letters = self.letter_grid(assignment)
-
-        # Create a blank canvas
-        img = Image.new(
-            "RGBA",
-            (self.crossword.width * cell_size,
-             self.crossword.height * cell_size),
-            "black"
+        default_renderer().save(
+            self.crossword, self.letter_grid(assignment), filename, cell_size
         )
-        font = ImageFont.truetype("assets/fonts/OpenSans-Regular.ttf", 80)
-        draw = ImageDraw.Draw(img)
 
-        for i in range(self.crossword.height):
-            for j in range(self.crossword.width):
+    def solve(self, restart_limit=None):
+        """
+        Return a complete assignment, or None if there is none.
 
-                rect = [
-                    (j * cell_size + cell_border,
-                     i * cell_size + cell_border),
-                    ((j + 1) * cell_size - cell_border,
-                     (i + 1) * cell_size - cell_border)
-                ]
-                if self.crossword.structure[i][j]:
-                    draw.rectangle(rect, fill="white")
-                    if letters[i][j]:
-                        _, _, w, h = draw.textbbox((0, 0), letters[i][j], font=font)
-                        draw.text(
-                            (rect[0][0] + ((interior_size - w) / 2),
-                             rect[0][1] + ((interior_size - h) / 2) - 10),
-                            letters[i][j], fill="black", font=font
-                        )
+        If `restart_limit` is given, the search is restarted from scratch
+        every time it expands that many nodes, and the limit doubles on
+        each restart. This is only useful together with a `seed`.
+        """
+        if not self.prepare():
+            return None
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+        try:
+            while True:
+                self.node_budget = restart_limit
+                try:
+                    if self.backjumping:
+                        return self.backjump(dict())[0]
+                    return self.backtrack(dict())
+                except SearchLimitReached:
+                    self.restore(0)
+                    self.forget_pruning(0)
+                    self.used_words.clear()
+                    restart_limit *= 2
+        finally:
+            if stats is not None:
+                stats.search_time += time.perf_counter() - start
 
-        img.save(filename)
+    def solutions(self, unique=True):
+        """
+        Generate complete assignments one at a time.
 
-    def solve(self):
+        The search is suspended between solutions, so asking for the next
+        one carries on from where the last one was found. If `unique` is
+        true, solutions that are a symmetry of the structure applied to
+        an earlier one are skipped. Always uses chronological search, even
+        if the creator was made with `backjump`.
+        """
+        if not self.prepare():
+            return
+        symmetries = self.crossword.symmetries() if unique else []
+        seen = set()
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+        for assignment in self.search(dict()):
+            if symmetries:
+                key = self.canonical_grid(assignment, symmetries)
+                if key in seen:
+                    continue
+                seen.add(key)
+            if stats is not None:
+                stats.search_time += time.perf_counter() - start
+            yield dict(assignment)
+            if stats is not None:
+                start = time.perf_counter()
 
+    def prepare(self):
+        """
+        Enforce node and arc consistency before search, and clear any
+        state left over from a previous search. Return False if a domain
+        is wiped out.
+        """
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
         self.enforce_node_consistency()
-        self.ac3()
-        return self.backtrack(dict())
+        if stats is not None:
+            stats.node_consistency_time += time.perf_counter() - start
+            start = time.perf_counter()
+        consistent = self.ac3()
+        if stats is not None:
+            stats.ac3_time += time.perf_counter() - start
+        self.trail.clear()
+        self.used_words.clear()
+        return consistent
+
+    def canonical_grid(self, assignment, symmetries):
+        """
+        Return the same string for an assignment and for every image of it
+        under the given symmetries of the structure.
+        """
+        letters = self.letter_grid(assignment)
+        cells = [
+            (i, j)
+            for i in range(self.crossword.height)
+            for j in range(self.crossword.width)
+            if self.crossword.structure[i][j]
+        ]
+        images = list()
+        for symmetry in symmetries:
+            image = dict()
+            for i, j in cells:
+                image[symmetry(i, j)] = letters[i][j] or " "
+            images.append("".join(image[cell] for cell in cells))
+        return min(images)
 
     def enforce_node_consistency(self):
-        remove_words = list()
         for var in self.crossword.variables:
-            for word in self.domains[var]:
-                if len(word) != var.length:
-                    remove_words.append(word)
-            for word in remove_words:
-                self.domains[var].remove(word)
-            remove_words.clear()
+            self.domains[var] &= self.table.full(var.length)
+
+    def domain_words(self, var):
+        """
+        Return list of the words in the domain of `var`.
+        """
+        return self.table.decode(var.length, self.domains[var])
+
+    def set_domain(self, var, domain):
+        """
+        Replace the domain of `var`, recording the old one on the trail.
+        """
+        self.trail.append((var, self.domains[var]))
+        self.domains[var] = domain
+
+    def restore(self, mark):
+        """
+        Undo every domain change recorded on the trail since it had
+        length `mark`.
+        """
+        while len(self.trail) > mark:
+            var, domain = self.trail.pop()
+            self.domains[var] = domain
+
+    def propagate(self, var, value):
+        """
+        Reduce the domain of `var` to `value` and restore arc consistency
+        on the arcs pointing at `var`. Return False if a domain is wiped out.
+        """
+        self.set_domain(var, self.table.bit(value))
+        return self.ac3([(z, var) for z in self.crossword.neighbors(var)])
 
     def revise(self, x, y):
-        revised = False
-        overlap = self.crossword.overlaps[x, y]
+        overlap = self.crossword.overlaps.get((x, y))
         if overlap is None:
             return False
+        if self.stats is not None:
+            self.stats.revisions += 1
         i, j = overlap
-        remove_words = list()
-        for word in self.domains[x]:
-            if not any(word[i] == word2[j] for word2 in self.domains[y]):
-                remove_words.append(word)
-                revised = True
-        for word in remove_words:
-            self.domains[x].remove(word)
-        return revised
+        domain = self.domains[x]
+        support = self.domains[y]
+        y_masks = self.table.masks(y.length)[j]
+        removed = 0
+        for letter, mask in self.table.masks(x.length)[i].items():
+            if domain & mask and not support & y_masks.get(letter, 0):
+                removed |= mask
+        if not domain & removed:
+            return False
+        if self.stats is not None:
+            self.stats.pruned += (domain & removed).bit_count()
+        self.set_domain(x, domain & ~removed)
+        return True
 
     def ac3(self, arcs=None):
         if arcs is None:
             arcs = [(x, y) for x in self.crossword.variables for y in self.crossword.neighbors(x)]
-        while arcs:
-            x, y = arcs.pop(0)
+        queue = deque(arcs)
+        queued = set(queue)
+        while queue:
+            arc = queue.popleft()
+            queued.discard(arc)
+            x, y = arc
             if self.revise(x, y):
                 if not self.domains[x]:
                     return False
-                for z in self.crossword.neighbors(x) - {y}:
-                    arcs.append((z, x))
+                for z in self.crossword.neighbors(x):
+                    if z != y and (z, x) not in queued:
+                        queue.append((z, x))
+                        queued.add((z, x))
         return True
 
     def assignment_complete(self, assignment):
@@ -135,6 +322,10 @@ class CrosswordCreator():
         return True
 
     def consistent(self, assignment):
+        assignment = {
+            var: word for var, word in assignment.items()
+            if word is not None
+        }
         for x in assignment.keys():
             if x.length != len(assignment[x]):
                 return False
@@ -147,67 +338,388 @@ class CrosswordCreator():
             return False
         return True
 
+    def consistent_value(self, var, value, assignment):
+        """
+        Return True if assigning `value` to `var` is consistent with an
+        assignment that is already consistent. Only `var` itself and its
+        assigned neighbors are checked.
+        """
+        if var.length != len(value) or value in self.used_words:
+            return False
+        for y in self.crossword.neighbors(var):
+            if y in assignment:
+                i, j = self.crossword.overlaps[var, y]
+                if value[i] != assignment[y][j]:
+                    return False
+        return True
+
+    def assign(self, var, value, assignment):
+        """
+        Add `var = value` to the assignment.
+        """
+        assignment[var] = value
+        self.used_words.add(value)
+        if self.on_assign is not None:
+            self.on_assign(var, value, assignment)
+
+    def unassign(self, var, assignment):
+        """
+        Remove `var` from the assignment.
+        """
+        self.used_words.remove(assignment.pop(var))
+        if self.on_unassign is not None:
+            self.on_unassign(var, assignment)
+
     def order_domain_values(self, var, assignment):
+        # For each unassigned neighbor, count how many of its words have
+        # each letter at the overlap, so that a word rules out everything
+        # in the neighbor's domain except the words counted for its letter
+        neighbors = list()
+        for var2 in self.crossword.neighbors(var):
+            if var2 in assignment.keys():
+                continue
+            i, j = self.crossword.overlaps[var, var2]
+            domain = self.domains[var2]
+            counts = {
+                letter: (domain & mask).bit_count()
+                for letter, mask in self.table.masks(var2.length)[j].items()
+            }
+            neighbors.append((i, domain.bit_count(), counts))
         rank_dict = list()
-        for word in self.domains[var]:
+        for word in self.domain_words(var):
             eliminated = 0
-            for var2 in self.crossword.neighbors(var):
-                if var2 in assignment.keys():
-                    continue
-                i, j = self.crossword.overlaps[var, var2]
-                for word2 in self.domains[var2]:
-                    if word[i] != word2[j]:
-                        eliminated += 1
-            rank_dict.append((word, eliminated))
-        rank_dict.sort(key = lambda x: x[1])
-        return list(word for word, _ in rank_dict)
-        
+            for i, total, counts in neighbors:
+                eliminated += total - counts.get(word[i], 0)
+            rank_dict.append((word, eliminated, self.tie_break()))
+        rank_dict.sort(key = lambda x: (x[1], x[2]))
+        return list(word for word, _, _ in rank_dict)
 
     def select_unassigned_variable(self, assignment):
         arr = list()
         for key in self.domains.keys():
             if key not in assignment.keys():
-                arr.append((key, len(self.domains[key]), len(self.crossword.neighbors(key))))
-        arr.sort(key = lambda x: (x[1], -x[2]))
+                arr.append((key, self.domains[key].bit_count(), len(self.crossword.neighbors(key)), self.tie_break()))
+        arr.sort(key = lambda x: (x[1], -x[2], x[3]))
         return arr[0][0]
 
+    def tie_break(self):
+        """
+        Return sort key used to break ties between equally ranked choices.
+        """
+        return self.random.random() if self.random is not None else 0
+
     def backtrack(self, assignment):
+        return next(self.search(assignment), None)
+
+    def search(self, assignment):
+        """
+        Generate every completion of `assignment`. While a completion is
+        being handled, the domains and the assignment are left as they are
+        in the search, so they must not be modified.
+        """
         if (self.assignment_complete(assignment)):
-            return assignment
+            yield assignment
+            return
+        if self.node_budget is not None:
+            self.node_budget -= 1
+            if self.node_budget < 0:
+                raise SearchLimitReached
+        if self.stats is not None:
+            self.stats.nodes += 1
         var = self.select_unassigned_variable(assignment)
         for value in self.order_domain_values(var, assignment):
-            assignment[var] = value
-            if self.consistent(assignment):
-                result = self.backtrack(assignment)
-                if result is not None:
-                    return result
-            assignment[var] = None
+            if not self.consistent_value(var, value, assignment):
+                continue
+            self.assign(var, value, assignment)
+            mark = len(self.trail)
+            if not self.mac or self.propagate(var, value):
+                yield from self.search(assignment)
+            self.restore(mark)
+            self.unassign(var, assignment)
+            if self.stats is not None:
+                self.stats.backtracks += 1
+
+    def forward_check(self, var, value, assignment):
+        """
+        Remove words that do not fit `var = value` from the domains of the
+        unassigned neighbors of `var`, recording `var` as having pruned
+        them. Return the first neighbor whose domain is wiped out, if any.
+        """
+        for z in self.crossword.neighbors(var):
+            if z in assignment:
+                continue
+            i, j = self.crossword.overlaps[var, z]
+            domain = self.domains[z]
+            reduced = domain & self.table.masks(z.length)[j].get(value[i], 0)
+            if reduced != domain:
+                self.set_domain(z, reduced)
+                self.pruned_by[z].append(var)
+                self.explained.append(z)
+                if not reduced:
+                    return z
         return None
 
+    def forget_pruning(self, mark):
+        """
+        Undo the pruning explanations recorded since `self.explained` had
+        length `mark`.
+        """
+        while len(self.explained) > mark:
+            self.pruned_by[self.explained.pop()].pop()
 
-def main():
+    def learn(self, conflict, assignment):
+        """
+        Record the assignments of the variables in `conflict` as a nogood,
+        if it has one or two of them.
+        """
+        pairs = [(y, assignment[y]) for y in conflict]
+        if len(pairs) == 1:
+            self.dead_values.add(pairs[0])
+        elif len(pairs) == 2:
+            first, second = pairs
+            self.nogoods.setdefault(first, set()).add(second)
+            self.nogoods.setdefault(second, set()).add(first)
 
-    # Check usage
-    if len(sys.argv) not in [3, 4]:
-        sys.exit("Usage: python generate.py structure words [output]")
+    def backjump(self, assignment):
+        """
+        Search with forward checking and conflict-directed backjumping.
+
+        Return `(assignment, None)` if the assignment can be completed, and
+        otherwise `(None, conflict)`, where `conflict` is a set of assigned
+        variables whose current values already rule out every completion.
+        Callers not in `conflict` return straight away, so the search jumps
+        back to the most recent variable that caused the failure. Small
+        conflict sets are learned as nogoods and checked before assigning.
+        """
+        if (self.assignment_complete(assignment)):
+            return assignment, None
+        if self.node_budget is not None:
+            self.node_budget -= 1
+            if self.node_budget < 0:
+                raise SearchLimitReached
+        if self.stats is not None:
+            self.stats.nodes += 1
+        var = self.select_unassigned_variable(assignment)
+
+        # Variables whose values ruled out values of `var`
+        conflict = set()
+        for value in self.order_domain_values(var, assignment):
+            if (var, value) in self.dead_values:
+                continue
+            if value in self.used_words:
+                conflict.update(
+                    y for y, word in assignment.items() if word == value
+                )
+                continue
+            culprits = [
+                y for y, word in self.nogoods.get((var, value), ())
+                if assignment.get(y) == word
+            ]
+            if culprits:
+                conflict.add(culprits[0])
+                continue
+
+            self.assign(var, value, assignment)
+            mark = len(self.trail)
+            explained = len(self.explained)
+            wiped = self.forward_check(var, value, assignment)
+            if wiped is None:
+                result, child_conflict = self.backjump(assignment)
+                if result is not None:
+                    return result, None
+            else:
+                child_conflict = set(self.pruned_by[wiped])
+            self.restore(mark)
+            self.forget_pruning(explained)
+            self.unassign(var, assignment)
+            if self.stats is not None:
+                self.stats.backtracks += 1
+
+            # Jump over `var` if its value played no part in the failure
+            if var not in child_conflict:
+                return None, child_conflict
+            conflict |= child_conflict - {var}
+
+        conflict.update(self.pruned_by[var])
+        self.learn(conflict, assignment)
+        return None, conflict
+
+
+def portfolio(n):
+    """
+    Return list of `n` search strategies for `solve_portfolio`.
+
+    The first strategy is the plain deterministic search; the rest break
+    ties randomly with different seeds, and every other one backjumps and
+    restarts with a growing node limit, keeping its learned nogoods.
+    """
+    strategies = [{
+        "name": "default",
+        "seed": None,
+        "restart_limit": None,
+        "backjump": False
+    }]
+    for k in range(1, n):
+        if k % 2:
+            strategies.append({
+                "name": f"random-{k}",
+                "seed": k,
+                "restart_limit": None,
+                "backjump": False
+            })
+        else:
+            strategies.append({
+                "name": f"restarts-{k}",
+                "seed": k,
+                "restart_limit": 50 * k,
+                "backjump": True
+            })
+    return strategies
+
+
+def run_strategy(crossword, strategy, results):
+    """
+    Solve `crossword` with one portfolio strategy and report the result.
+    """
+    creator = CrosswordCreator(
+        crossword, seed=strategy["seed"], backjump=strategy["backjump"]
+    )
+    assignment = creator.solve(restart_limit=strategy["restart_limit"])
+    results.put((assignment, strategy["name"]))
+
+
+def solve_portfolio(crossword, strategies=None, timeout=None):
+    """
+    Run several search strategies in parallel, one process each, and
+    return `(assignment, name)` for the first strategy to finish. The other
+    processes are terminated.
+
+    Every strategy is complete, so if the winner found no solution then
+    the assignment is None. If `timeout` seconds pass first, or every
+    process dies without a result, return `(None, None)`.
+    """
+    if strategies is None:
+        strategies = portfolio(os.cpu_count() or 1)
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=run_strategy,
+            args=(crossword, strategy, results),
+            daemon=True
+        )
+        for strategy in strategies
+    ]
+    for worker in workers:
+        worker.start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        while True:
+            wait = 0.1
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return None, None
+            try:
+                return results.get(timeout=wait)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    try:
+                        return results.get(timeout=1)
+                    except queue.Empty:
+                        return None, None
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+def main():
 
     # Parse command-line arguments
-    structure = sys.argv[1]
-    words = sys.argv[2]
-    output = sys.argv[3] if len(sys.argv) == 4 else None
+    parser = argparse.ArgumentParser(
+        usage="python generate.py structure words [output]"
+    )
+    parser.add_argument("structure")
+    parser.add_argument("words")
+    parser.add_argument("output", nargs="?")
+    parser.add_argument(
+        "--portfolio", type=int, metavar="N",
+        help="run N search strategies in parallel (0 for one per core)"
+    )
+    parser.add_argument(
+        "--timeout", type=float, metavar="SECONDS",
+        help="give up on a portfolio search after this many seconds"
+    )
+    parser.add_argument(
+        "--backjump", action="store_true",
+        help=(
+            "use forward checking with conflict-directed backjumping (not "
+            "available with --portfolio, whose strategies already mix both "
+            "searches)"
+        )
+    )
+    parser.add_argument(
+        "--stats", action="store_true",
+        help="print solver statistics (not available with --portfolio)"
+    )
+    parser.add_argument(
+        "--count", type=int, default=1, metavar="N",
+        help=(
+            "generate up to N distinct solutions, numbering the output "
+            "files (not available with --portfolio or --backjump)"
+        )
+    )
+    args = parser.parse_intermixed_args()
+    if args.count != 1 and (args.portfolio is not None or args.backjump):
+        parser.error("--count cannot be used with --portfolio or --backjump")
+    if args.timeout is not None and args.portfolio is None:
+        parser.error("--timeout can only be used with --portfolio")
+    if args.stats and args.portfolio is not None:
+        parser.error("--stats cannot be used with --portfolio")
+    if args.backjump and args.portfolio is not None:
+        parser.error("--backjump cannot be used with --portfolio")
 
     # Generate crossword
-    crossword = Crossword(structure, words)
-    creator = CrosswordCreator(crossword)
-    assignment = creator.solve()
+    crossword = Crossword(args.structure, args.words)
+    creator = CrosswordCreator(
+        crossword, stats=args.stats, backjump=args.backjump
+    )
+    if args.count != 1:
+        found = 0
+        for assignment in itertools.islice(creator.solutions(), args.count):
+            found += 1
+            if found > 1:
+                print()
+            creator.print(assignment)
+            if args.output:
+                root, extension = os.path.splitext(args.output)
+                creator.save(assignment, f"{root}{found}{extension}")
+        if not found:
+            print("No solution.")
+        if args.stats:
+            print(creator.stats)
+        return
+    if args.portfolio is None:
+        assignment = creator.solve()
+        if args.stats:
+            print(creator.stats)
+    else:
+        strategies = portfolio(args.portfolio or os.cpu_count() or 1)
+        assignment, winner = solve_portfolio(
+            crossword, strategies, args.timeout
+        )
+        if winner is None:
+            sys.exit("Timed out.")
+        print(f"Solved by strategy: {winner}")
 
     # Print result
     if assignment is None:
         print("No solution.")
     else:
         creator.print(assignment)
-        if output:
-            creator.save(assignment, output)
+        if args.output:
+            creator.save(assignment, args.output)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+import os
+
+from xml.sax.saxutils import escape
+
+FONT_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "assets", "fonts", "OpenSans-Regular.ttf"
+)
+
+# Renderer shared by every save in this process, see `default_renderer`
+RENDERER = None
+
+
+class Renderer():
+
+    def __init__(self, font_file=FONT_FILE):
+        """
+        Create a renderer for crossword grids.
+
+        Fonts are loaded once per size, and each letter is rasterized once
+        per cell size into a tile that is pasted into every grid using it.
+        """
+        self.font_file = font_file
+        self.fonts = dict()
+        self.tiles = dict()
+
+    def font(self, size):
+        """Return the font at the given size, loading it the first time."""
+        from PIL import ImageFont
+        if size not in self.fonts:
+            self.fonts[size] = ImageFont.truetype(self.font_file, size)
+        return self.fonts[size]
+
+    def tile(self, letter, cell_size):
+        """
+        Return image of one open cell of the grid, containing `letter`, or
+        empty if `letter` is None.
+        """
+        from PIL import Image, ImageDraw
+        key = (letter, cell_size)
+        if key in self.tiles:
+            return self.tiles[key]
+
+        # Proportions match the original 100 pixel cells: a 2 pixel border,
+        # 80 point letters, and letters raised by 10 pixels
+        cell_border = max(1, cell_size // 50)
+        interior_size = cell_size - 2 * cell_border
+        tile = Image.new("RGBA", (cell_size, cell_size), "black")
+        draw = ImageDraw.Draw(tile)
+        draw.rectangle(
+            [(cell_border, cell_border),
+             (cell_size - cell_border, cell_size - cell_border)],
+            fill="white"
+        )
+        if letter:
+            font = self.font(cell_size * 4 // 5)
+            _, _, w, h = draw.textbbox((0, 0), letter, font=font)
+            draw.text(
+                (cell_border + ((interior_size - w) / 2),
+                 cell_border + ((interior_size - h) / 2) - cell_size / 10),
+                letter, fill="black", font=font
+            )
+        self.tiles[key] = tile
+        return tile
+
+    def render(self, crossword, letters, cell_size=100):
+        """
+        Return image of a crossword, given its grid of letters as returned
+        by `CrosswordCreator.letter_grid`.
+        """
+        from PIL import Image
+        img = Image.new(
+            "RGBA",
+            (crossword.width * cell_size, crossword.height * cell_size),
+            "black"
+        )
+        for i in range(crossword.height):
+            for j in range(crossword.width):
+                if crossword.structure[i][j]:
+                    img.paste(
+                        self.tile(letters[i][j], cell_size),
+                        (j * cell_size, i * cell_size)
+                    )
+        return img
+
+    def svg(self, crossword, letters, cell_size=100):
+        """
+        Return a crossword as SVG markup, with the same layout as `render`.
+        """
+        cell_border = max(1, cell_size // 50)
+        interior_size = cell_size - 2 * cell_border
+        width = crossword.width * cell_size
+        height = crossword.height * cell_size
+        elements = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" '
+            f'height="{height}" viewBox="0 0 {width} {height}">',
+            f'<rect width="{width}" height="{height}" fill="black"/>',
+            f'<g font-family="Open Sans, sans-serif" '
+            f'font-size="{cell_size * 4 // 5}" text-anchor="middle">'
+        ]
+        for i in range(crossword.height):
+            for j in range(crossword.width):
+                if not crossword.structure[i][j]:
+                    continue
+                x = j * cell_size + cell_border
+                y = i * cell_size + cell_border
+                elements.append(
+                    f'<rect x="{x}" y="{y}" width="{interior_size}" '
+                    f'height="{interior_size}" fill="white"/>'
+                )
+                if letters[i][j]:
+                    elements.append(
+                        f'<text x="{x + interior_size / 2}" '
+                        f'y="{y + interior_size / 2}" '
+                        f'dominant-baseline="central">'
+                        f'{escape(letters[i][j])}</text>'
+                    )
+        elements.append("</g>")
+        elements.append("</svg>")
+        return "\n".join(elements)
+
+    def save(self, crossword, letters, filename, cell_size=100):
+        """
+        Save a crossword to a file, as SVG if `filename` ends in `.svg`
+        and as an image in the format given by its extension otherwise.
+        """
+        if filename.lower().endswith(".svg"):
+            with open(filename, "w") as f:
+                f.write(self.svg(crossword, letters, cell_size))
+        else:
+            self.render(crossword, letters, cell_size).save(filename)
+
+
+def default_renderer():
+    """Return the renderer shared within this process."""
+    global RENDERER
+    if RENDERER is None:
+        RENDERER = Renderer()
+    return RENDERER
@@ -0,0 +1,231 @@
+import heapq
+import itertools
+
+from heredity import PROBS
+
+GENES = (0, 1, 2)
+
+
+class Factor():
+
+    def __init__(self, variables, table):
+        """
+        Create a factor over the gene counts of the people in `variables`.
+        `table` maps each tuple of gene counts, in the order of
+        `variables`, to a non-negative value.
+        """
+        self.variables = tuple(variables)
+        self.table = table
+
+    def value(self, assignment):
+        """Return value of the factor under a dict of gene counts."""
+        return self.table[tuple(assignment[v] for v in self.variables)]
+
+    def marginal(self, variables):
+        """Return factor summing this one over all but `variables`."""
+        positions = [self.variables.index(v) for v in variables]
+        table = dict.fromkeys(itertools.product(GENES, repeat=len(variables)),
+                              0)
+        for values, p in self.table.items():
+            table[tuple(values[i] for i in positions)] += p
+        return Factor(variables, table)
+
+    def normalized(self):
+        """Return factor scaled to sum to 1, so products do not underflow."""
+        total = sum(self.table.values())
+        return Factor(self.variables, {
+            values: p / total for values, p in self.table.items()
+        })
+
+
+def product(variables, factors):
+    """Return factor over `variables` multiplying together `factors`."""
+    table = dict()
+    for values in itertools.product(GENES, repeat=len(variables)):
+        assignment = dict(zip(variables, values))
+        p = 1
+        for factor in factors:
+            p *= factor.value(assignment)
+        table[values] = p
+    return Factor(variables, table)
+
+
+def passing(gene):
+    """Return probability that a parent with `gene` copies passes one on."""
+    if gene == 2:
+        return 1 - PROBS["mutation"]
+    elif gene == 1:
+        return 0.5
+    else:
+        return PROBS["mutation"]
+
+
+def inheritance(gene, mother, father):
+    """
+    Return probability that a child has `gene` copies given the gene
+    counts of its parents.
+    """
+    from_mother = passing(mother)
+    from_father = passing(father)
+    if gene == 2:
+        return from_mother * from_father
+    elif gene == 1:
+        return (from_mother * (1 - from_father)
+                + from_father * (1 - from_mother))
+    else:
+        return (1 - from_mother) * (1 - from_father)
+
+
+def compile_factors(people):
+    """
+    Return list of factors whose product is the joint probability of
+    everyone's gene counts and the observed traits.
+
+    As in `joint_probability`, a parent missing from the data is treated
+    as having no copies of the gene.
+    """
+    factors = list()
+    for person in people:
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        trait = people[person]["trait"]
+        if mother is None and father is None:
+            variables = (person,)
+            table = {(gene,): PROBS["gene"][gene] for gene in GENES}
+        else:
+            parents = [p for p in dict.fromkeys((mother, father))
+                       if p in people]
+            variables = (person, *parents)
+            table = dict()
+            for values in itertools.product(GENES, repeat=len(variables)):
+                genes = dict(zip(variables, values))
+                table[values] = inheritance(
+                    genes[person], genes.get(mother, 0), genes.get(father, 0)
+                )
+        if trait is not None:
+            for values in table:
+                table[values] *= PROBS["trait"][values[0]][trait]
+        factors.append(Factor(variables, table))
+    return factors
+
+
+def elimination_order(people, factors):
+    """
+    Return order in which to eliminate everyone's gene count, greedily
+    choosing the person with the fewest neighbors in the graph linking
+    people who share a factor, and the list of neighbors each had when
+    eliminated.
+    """
+    neighbors = {person: set() for person in people}
+    for factor in factors:
+        for a, b in itertools.combinations(factor.variables, 2):
+            neighbors[a].add(b)
+            neighbors[b].add(a)
+
+    # Heap entries go stale as degrees change, and are skipped
+    heap = [(len(neighbors[p]), n, p) for n, p in enumerate(people)]
+    heapq.heapify(heap)
+    index = {person: n for n, person in enumerate(people)}
+    order = list()
+    separators = list()
+    eliminated = set()
+    while heap:
+        degree, _, person = heapq.heappop(heap)
+        if person in eliminated or degree != len(neighbors[person]):
+            continue
+        eliminated.add(person)
+        order.append(person)
+        remaining = neighbors.pop(person)
+        separators.append(remaining)
+        for neighbor in remaining:
+            neighbors[neighbor].discard(person)
+            neighbors[neighbor].update(remaining - {neighbor})
+            heapq.heappush(
+                heap, (len(neighbors[neighbor]), index[neighbor], neighbor)
+            )
+    return order, separators
+
+
+def infer(people):
+    """
+    Return dict mapping each person to their gene and trait probabilities
+    given the data, as computed by `main`, by exact inference on a
+    junction tree of the pedigree.
+
+    People are eliminated in turn; each one forms a cluster with their
+    remaining neighbors, attached to the cluster of whichever of those
+    neighbors is eliminated first. Messages are passed up the tree and
+    then back down, so the cost is linear in the number of people when
+    clusters stay small, as they do for tree-shaped families.
+    """
+    factors = compile_factors(people)
+    order, separators = elimination_order(people, factors)
+    position = {person: n for n, person in enumerate(order)}
+    clusters = [
+        (person, *sorted(separator, key=position.get))
+        for person, separator in zip(order, separators)
+    ]
+    parents = [
+        order[min(position[v] for v in separator)] if separator else None
+        for separator in separators
+    ]
+    children = {person: list() for person in order}
+    for person, parent in zip(order, parents):
+        if parent is not None:
+            children[parent].append(person)
+
+    # Each factor belongs to the cluster of its first eliminated person
+    assigned = {person: list() for person in order}
+    for factor in factors:
+        first = min(factor.variables, key=position.get)
+        assigned[first].append(factor)
+
+    # Pass messages from the leaves up to the roots
+    potentials = dict()
+    upward = dict()
+    for n, person in enumerate(order):
+        incoming = [upward[child] for child in children[person]]
+        potentials[person] = product(
+            clusters[n], assigned[person] + incoming
+        )
+        if parents[n] is not None:
+            upward[person] = potentials[person].marginal(
+                clusters[n][1:]
+            ).normalized()
+
+    # Pass messages back down, dividing out what each child sent up
+    beliefs = dict()
+    for n in reversed(range(len(order))):
+        person = order[n]
+        belief = potentials[person]
+        parent = parents[n]
+        if parent is not None:
+            downward = beliefs[parent].marginal(clusters[n][1:])
+            sent = upward[person]
+            belief = Factor(belief.variables, {
+                values: p * divide(
+                    downward.table[values[1:]], sent.table[values[1:]]
+                )
+                for values, p in belief.table.items()
+            })
+        beliefs[person] = belief.normalized()
+
+    probabilities = dict()
+    for person in people:
+        genes = beliefs[person].marginal((person,)).table
+        gene = {g: genes[(g,)] for g in (2, 1, 0)}
+        trait = people[person]["trait"]
+        if trait is None:
+            have = sum(gene[g] * PROBS["trait"][g][True] for g in GENES)
+        else:
+            have = 1.0 if trait else 0.0
+        probabilities[person] = {
+            "gene": gene,
+            "trait": {True: have, False: 1 - have}
+        }
+    return probabilities
+
+
+def divide(a, b):
+    """Return `a / b`, taking `0 / 0` to be 0."""
+    return a / b if b else 0.0
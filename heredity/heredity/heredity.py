@@ -1,6 +1,6 @@
+import argparse
 import csv
 import itertools
-import sys
 
 PROBS = {
 
@@ -40,9 +40,27 @@ PROBS = {
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
-    people = load_data(sys.argv[1])
+    parser = argparse.ArgumentParser(usage="python heredity.py data.csv")
+    parser.add_argument("data")
+    parser.add_argument(
+        "--elimination", action="store_true",
+        help="compute exact probabilities by message passing on a junction "
+             "tree, in time linear in family size for tree-shaped families"
+    )
+    parser.add_argument(
+        "--vectorized", action="store_true",
+        help="enumerate gene assignments in NumPy batches"
+    )
+    args = parser.parse_args()
+    people = load_data(args.data)
+    if args.elimination:
+        import elimination
+        show(people, elimination.infer(people))
+        return
+    if args.vectorized:
+        import vectorized
+        show(people, vectorized.infer(people))
+        return
 
     # Keep track of gene and trait probabilities for each person
     probabilities = {
@@ -60,31 +78,23 @@ def main():
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
+    # Loop over all sets of people who might have the gene; traits depend
+    # only on each person's own gene, so they are summed over analytically
     names = set(people)
-    for have_trait in powerset(names):
+    for one_gene in powerset(names):
+        for two_genes in powerset(names - one_gene):
 
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
-
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
-
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+            # Update probabilities with probability of genes and evidence
+            p = evidence_probability(people, one_gene, two_genes)
+            update_marginals(probabilities, people, one_gene, two_genes, p)
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
+    show(people, probabilities)
+
 
-    # Print results
+def show(people, probabilities):
+    """Print gene and trait probabilities for each person."""
     for person in people:
         print(f"{person}:")
         for field in probabilities[person]:
@@ -127,29 +137,53 @@ def get(person, one_gene, two_genes):
         return PROBS["mutation"]
 
 
+def gene_probability(people, person, gene, one_gene, two_genes):
+    """
+    Return probability that `person` has `gene` copies of the gene, given
+    the gene counts of their parents.
+    """
+    mother_name = people[person]["mother"]
+    father_name = people[person]["father"]
+
+    if mother_name is None and father_name is None:
+        return PROBS["gene"][gene]
+
+    inherit_mother = get(mother_name, one_gene, two_genes)
+    inherit_father = get(father_name, one_gene, two_genes)
+
+    if gene == 0:
+        return (1 - inherit_mother) * (1 - inherit_father)
+    elif gene == 1:
+        return (inherit_father * (1 - inherit_mother) + inherit_mother * (1 - inherit_father))
+    else:
+        return inherit_father * inherit_mother
+
+
 def joint_probability(people, one_gene, two_genes, have_trait):
     join_prob = 1
     for person in people:
         gene = 2 if person in two_genes else 1 if person in one_gene else 0
         trait = person in have_trait
-        P = 1
+        P = gene_probability(people, person, gene, one_gene, two_genes)
+        P *= PROBS["trait"][gene][trait]
+        join_prob *= P
+    return join_prob
 
-        mother_name = people[person]["mother"]
-        father_name = people[person]["father"]
 
-        if mother_name is None and father_name is None:
-             P *= PROBS["gene"][gene]
-        else:
-            inherit_mother = get(mother_name, one_gene, two_genes)
-            inherit_father = get(father_name, one_gene, two_genes)
-
-            if gene == 0:
-                P *= (1 - inherit_mother) * (1 - inherit_father)
-            elif gene == 1:
-                P *= (inherit_father * (1 - inherit_mother) + inherit_mother * (1 - inherit_father))
-            else:
-                P *= inherit_father * inherit_mother
-        P *= PROBS["trait"][gene][trait]
+def evidence_probability(people, one_gene, two_genes):
+    """
+    Return joint probability that people in `one_gene` have one copy of
+    the gene, people in `two_genes` have two, everyone else has none, and
+    everyone whose trait is known has it or not as observed. Unknown traits
+    are summed over, so contribute no factor.
+    """
+    join_prob = 1
+    for person in people:
+        gene = 2 if person in two_genes else 1 if person in one_gene else 0
+        P = gene_probability(people, person, gene, one_gene, two_genes)
+        trait = people[person]["trait"]
+        if trait is not None:
+            P *= PROBS["trait"][gene][trait]
         join_prob *= P
     return join_prob
 
@@ -163,6 +197,26 @@ def update(probabilities, one_gene, two_genes, have_trait, p):
         probabilities[person]["trait"][trait] += p
 
 
+def update_marginals(probabilities, people, one_gene, two_genes, p):
+    """
+    Add `p`, the probability of a gene assignment and the evidence, to each
+    person's gene distribution, and split it between trait values by
+    their likelihood given that person's gene, or as observed.
+    """
+    for person in probabilities:
+        gene = 2 if person in two_genes else 1 if person in one_gene else 0
+        probabilities[person]["gene"][gene] += p
+
+        trait = people[person]["trait"]
+        if trait is not None:
+            probabilities[person]["trait"][trait] += p
+        else:
+            for value in (True, False):
+                probabilities[person]["trait"][value] += (
+                    p * PROBS["trait"][gene][value]
+                )
+
+
 def normalize(probabilities):
     for person in probabilities:
         sum_gene = 0
@@ -0,0 +1,95 @@
+import numpy as np
+
+from heredity import PROBS
+
+# Number of gene assignments evaluated together
+BATCH = 1 << 16
+
+
+def tables():
+    """
+    Return lookup tables of the prior probability of each gene count, the
+    probability of each child gene count given the parents' counts, indexed
+    as `[child, mother, father]`, and the probability of each trait value,
+    indexed as `[gene, trait]`.
+    """
+    prior = np.array([PROBS["gene"][gene] for gene in range(3)])
+    passing = np.array([PROBS["mutation"], 0.5, 1 - PROBS["mutation"]])
+    mother = passing[:, None]
+    father = passing[None, :]
+    inherit = np.array([
+        (1 - mother) * (1 - father),
+        mother * (1 - father) + father * (1 - mother),
+        mother * father
+    ])
+    trait = np.array([
+        [PROBS["trait"][gene][False], PROBS["trait"][gene][True]]
+        for gene in range(3)
+    ])
+    return prior, inherit, trait
+
+
+def infer(people, batch=BATCH):
+    """
+    Return dict mapping each person to their gene and trait probabilities
+    given the data, as computed by `main`.
+
+    Every assignment of gene counts is numbered in base 3 and decoded, a
+    batch at a time, into an array with one row per assignment and one
+    column per person. Each person's factor is looked up in the tables for
+    the whole batch at once, and the products are added to everyone's gene
+    counts with a single `bincount`. Traits are then summed over
+    analytically from the gene distributions.
+    """
+    names = list(people)
+    n = len(names)
+    index = {name: i for i, name in enumerate(names)}
+    prior, inherit, trait = tables()
+
+    # Parents missing from the data point at an extra column of no genes
+    mothers = np.array([index.get(people[p]["mother"], n) for p in names])
+    fathers = np.array([index.get(people[p]["father"], n) for p in names])
+    founders = np.array([
+        people[p]["mother"] is None and people[p]["father"] is None
+        for p in names
+    ])
+
+    # Likelihood of each person's observed trait, or 1 if unobserved
+    evidence = np.ones((n, 3))
+    for i, p in enumerate(names):
+        if people[p]["trait"] is not None:
+            evidence[i] = trait[:, int(people[p]["trait"])]
+
+    powers = 3 ** np.arange(n, dtype=np.int64)
+    columns = np.arange(n)
+    counts = np.zeros(3 * n)
+    for start in range(0, 3 ** n, batch):
+        codes = np.arange(start, min(start + batch, 3 ** n), dtype=np.int64)
+        genes = np.zeros((len(codes), n + 1), dtype=np.intp)
+        genes[:, :n] = codes[:, None] // powers % 3
+        own = genes[:, :n]
+        factors = np.where(
+            founders, prior[own],
+            inherit[own, genes[:, mothers], genes[:, fathers]]
+        )
+        factors *= evidence[columns, own]
+        p = factors.prod(axis=1)
+        counts += np.bincount(
+            (columns * 3 + own).ravel(),
+            weights=np.repeat(p, n), minlength=3 * n
+        )
+
+    genes = counts.reshape(n, 3)
+    genes /= genes.sum(axis=1, keepdims=True)
+    probabilities = dict()
+    for i, p in enumerate(names):
+        observed = people[p]["trait"]
+        if observed is None:
+            have = float(genes[i] @ trait[:, 1])
+        else:
+            have = 1.0 if observed else 0.0
+        probabilities[p] = {
+            "gene": {gene: float(genes[i, gene]) for gene in (2, 1, 0)},
+            "trait": {True: have, False: 1 - have}
+        }
+    return probabilities
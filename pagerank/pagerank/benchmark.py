@@ -0,0 +1,260 @@
+import argparse
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import outofcore
+import sparse
+from pagerank import DAMPING, SAMPLES, iterate_pagerank, sample_pagerank
+
+SIZES = [1000, 10000, 100000, 1000000, 10000000]
+KINDS = ["power-law", "dangling"]
+METHODS = ["sample", "iterate", "sparse-sample", "sparse-iterate",
+           "outofcore"]
+
+# Out-degrees follow a Zipf distribution with this exponent, capped at
+# MAX_DEGREE, and link targets are drawn with probability proportional to
+# (rank + 1) ** -POPULARITY for a random ranking of the pages
+EXPONENT = 2.1
+MAX_DEGREE = 1000
+POPULARITY = 0.8
+
+# Fraction of pages without links in dangling-heavy graphs
+DANGLING = 0.5
+
+# The dict-based methods are skipped on graphs with more pages than this
+DICT_LIMIT = 10000
+
+# Tolerance of the power iteration used as the reference solution
+REFERENCE_TOLERANCE = 1e-10
+
+
+def main():
+
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(
+        usage="python benchmark.py [output] [--compare baseline]",
+        description=(
+            "Rank synthetic power-law and dangling-heavy graphs of "
+            "increasing size with each PageRank method, and record time, "
+            "iterations, L1 error against a reference solution and peak "
+            "memory for each case as JSON."
+        )
+    )
+    parser.add_argument("output", nargs="?", help="file to write results to")
+    parser.add_argument(
+        "--compare", metavar="BASELINE",
+        help="report cases that got slower or took more iterations"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25,
+        help="allowed relative slowdown before a case is reported"
+    )
+    parser.add_argument(
+        "--memory", action="store_true",
+        help="also record peak memory, in a second, slower run"
+    )
+    parser.add_argument(
+        "--samples", type=int, default=SAMPLES,
+        help=f"number of samples for the sampling methods "
+             f"(default: {SAMPLES})"
+    )
+    parser.add_argument(
+        "--dict-limit", type=int, default=DICT_LIMIT,
+        help=f"largest graph to run the dict-based methods on "
+             f"(default: {DICT_LIMIT})"
+    )
+    parser.add_argument("--seeds", type=int, default=1)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--kinds", nargs="+", default=KINDS, choices=KINDS)
+    parser.add_argument(
+        "--methods", nargs="+", default=METHODS, choices=METHODS
+    )
+    args = parser.parse_args()
+
+    results = list()
+    for size in args.sizes:
+        for kind in args.kinds:
+            for seed in range(args.seeds):
+                graph = generate_graph(kind, size, seed)
+                reference, _ = sparse.iterate(
+                    graph, DAMPING, tolerance=REFERENCE_TOLERANCE,
+                    max_iterations=1000
+                )
+                for method in args.methods:
+                    case = {
+                        "kind": kind,
+                        "size": size,
+                        "seed": seed,
+                        "method": method,
+                        "links": len(graph.targets)
+                    }
+                    if method in ("sample", "iterate") \
+                            and size > args.dict_limit:
+                        case.update(status="skipped", seconds=None,
+                                    iterations=None, error=None,
+                                    peak_memory=None)
+                    else:
+                        case.update(run_case(
+                            graph, reference, method, seed, args.samples,
+                            args.memory
+                        ))
+                    print(format_case(case), flush=True)
+                    results.append(case)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cases": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["cases"]
+        regressions = compare(baseline, results, args.tolerance)
+        for message in regressions:
+            print(message)
+        print(f"{len(regressions)} regression(s)")
+
+
+def generate_graph(kind, size, seed):
+    """
+    Return a random graph of `size` pages, named by number, whose out- and
+    in-degrees follow power laws. In `dangling` graphs, a `DANGLING`
+    fraction of the pages have no links.
+    """
+    rng = np.random.default_rng([size, KINDS.index(kind), seed])
+    degrees = np.minimum(rng.zipf(EXPONENT, size), min(MAX_DEGREE, size - 1))
+    if kind == "dangling":
+        degrees[rng.random(size) < DANGLING] = 0
+    sources = np.repeat(np.arange(size), degrees)
+
+    # Invert the continuous power-law distribution to draw target ranks
+    u = rng.random(len(sources))
+    top = size ** (1 - POPULARITY)
+    ranks = ((top - 1) * u + 1) ** (1 / (1 - POPULARITY)) - 1
+    ranks = np.minimum(ranks.astype(np.int64), size - 1)
+    targets = rng.permutation(size)[ranks]
+    del u, ranks
+    return sparse.Graph.from_edges(range(size), sources, targets)
+
+
+def run_case(graph, reference, method, seed, samples, memory):
+    """
+    Rank `graph` with `method`, and return its status, time taken,
+    iterations to convergence, L1 error against `reference` and, if
+    `memory` is true, peak memory in bytes.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        prepared = prepare(graph, method, directory)
+        values, iterations, seconds = run(prepared, method, seed, samples)
+        result = {
+            "status": "done",
+            "seconds": seconds,
+            "iterations": iterations,
+            "error": float(np.abs(values - reference).sum()),
+            "peak_memory": None
+        }
+        if not memory:
+            return result
+
+        # Measure memory in a separate run, since tracing slows it down
+        tracemalloc.start()
+        try:
+            run(prepared, method, seed, samples)
+            result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def prepare(graph, method, directory):
+    """
+    Return the input `method` ranks, converting `graph` outside the timed
+    run: a corpus dict for the dict-based methods, or an edge list written
+    to `directory` for the out-of-core engine.
+    """
+    if method in ("sample", "iterate"):
+        return graph, graph.corpus()
+    if method == "outofcore":
+        return graph, outofcore.EdgeList.write(
+            directory, graph.pages, lambda: [(graph.sources, graph.targets)]
+        )
+    return graph, graph
+
+
+def run(prepared, method, seed, samples):
+    """
+    Run `method` once on `prepared` input. Return the ranks by page
+    number, the iterations taken, or None for sampling methods, and the
+    time taken.
+    """
+    graph, data = prepared
+    iterations = None
+    start = time.perf_counter()
+    if method == "sample":
+        random.seed(seed)
+        ranks = sample_pagerank(data, DAMPING, samples)
+    elif method == "iterate":
+        ranks = iterate_pagerank(data, DAMPING)
+    elif method == "sparse-sample":
+        values = sparse.sample(data, DAMPING, samples, seed=seed)
+    elif method == "sparse-iterate":
+        values, iterations = sparse.iterate(data, DAMPING)
+    else:
+        values, iterations = outofcore.iterate(data, DAMPING)
+    seconds = time.perf_counter() - start
+    if method in ("sample", "iterate"):
+        values = np.array([ranks[page] for page in graph.pages])
+    return values, iterations, seconds
+
+
+def format_case(case):
+    text = (
+        f"kind={case['kind']} size={case['size']} seed={case['seed']} "
+        f"method={case['method']}: {case['status']}"
+    )
+    if case["status"] == "skipped":
+        return text
+    text += f" in {case['seconds']:.4f}s"
+    if case["iterations"] is not None:
+        text += f", {case['iterations']} iterations"
+    text += f", error {case['error']:.2e}"
+    if case["peak_memory"] is not None:
+        text += f", {case['peak_memory'] / 1024 ** 2:.1f} MiB"
+    return text
+
+
+def compare(baseline, results, tolerance):
+    """
+    Return list of messages describing cases in `results` that took more
+    than `1 + tolerance` times as long as in `baseline`, took more
+    iterations, or changed status.
+    """
+    def key(case):
+        return tuple(
+            case[field] for field in ("kind", "size", "seed", "method")
+        )
+
+    previous = {key(case): case for case in baseline}
+    messages = list()
+    for case in results:
+        old = previous.get(key(case))
+        if old is None:
+            continue
+        name = format_case(case)
+        if case["status"] != old["status"]:
+            messages.append(f"{name} (was {old['status']})")
+        elif case["status"] == "skipped":
+            continue
+        elif (case["iterations"] or 0) > (old["iterations"] or 0):
+            messages.append(f"{name} (was {old['iterations']} iterations)")
+        elif case["seconds"] > old["seconds"] * (1 + tolerance):
+            messages.append(f"{name} (was {old['seconds']:.4f}s)")
+    return messages
+
+
+if __name__ == "__main__":
+    main()
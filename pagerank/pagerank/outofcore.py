@@ -0,0 +1,235 @@
+import concurrent.futures
+import json
+import os
+
+import numpy as np
+
+from sparse import MAX_ITERATIONS, TOLERANCE
+
+# Number of links read from disk at a time
+BLOCK_SIZE = 1 << 22
+
+# Number of HTML files parsed at a time when crawling into an edge list
+CHUNK_PAGES = 10000
+
+
+class EdgeList():
+
+    def __init__(self, directory):
+        """
+        Open a link graph written by `EdgeList.write`.
+
+        The directory holds `pages.txt`, naming page `n` on line `n`, and
+        the links sorted by source page: `targets.bin` has the target of
+        every link, and `offsets.npy` has, for each page, where its links
+        start. Targets are memory-mapped, so only the per-page arrays are
+        held in memory.
+        """
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        self.size = meta["pages"]
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        self.targets = np.memmap(
+            os.path.join(directory, "targets.bin"),
+            dtype=meta["dtype"], mode="r", shape=(meta["links"],)
+        ) if meta["links"] else np.zeros(0, dtype=meta["dtype"])
+        self.out_degree = np.diff(self.offsets)
+        self.dangling = self.out_degree == 0
+
+    @classmethod
+    def write(cls, directory, pages, chunks):
+        """
+        Write a link graph to `directory` and return it opened.
+
+        `pages` is an iterable of page names, and `chunks` a function
+        returning an iterable of `(sources, targets)` arrays of page
+        numbers, one link per position, in any order. It is called twice,
+        so that links can be counted and then placed by source without
+        ever holding them all in memory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        size = 0
+        with open(os.path.join(directory, "pages.txt"), "w") as f:
+            for page in pages:
+                f.write(f"{page}\n")
+                size += 1
+
+        # Count the links out of each page to find where they go
+        counts = np.zeros(size, dtype=np.int64)
+        for sources, _ in chunks():
+            counts += np.bincount(sources, minlength=size)
+        offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        links = int(offsets[-1])
+        dtype = "uint32" if size <= np.iinfo(np.uint32).max else "int64"
+
+        # Place each link after the ones already placed for its source
+        path = os.path.join(directory, "targets.bin")
+        if links:
+            targets = np.memmap(path, dtype=dtype, mode="w+", shape=(links,))
+            cursor = offsets[:-1].copy()
+            for sources, chunk_targets in chunks():
+                sources = np.asarray(sources, dtype=np.int64)
+                order = np.argsort(sources, kind="stable")
+                sources = sources[order]
+                first = np.searchsorted(sources, sources, side="left")
+                positions = cursor[sources] + np.arange(len(sources)) - first
+                targets[positions] = np.asarray(chunk_targets)[order]
+                cursor += np.bincount(sources, minlength=size)
+            targets.flush()
+            del targets
+        else:
+            open(path, "wb").close()
+
+        np.save(os.path.join(directory, "offsets.npy"), offsets)
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"pages": size, "links": links, "dtype": dtype}, f)
+        return cls(directory)
+
+    @classmethod
+    def from_corpus(cls, corpus, directory, chunk_pages=100000):
+        """
+        Write a corpus as returned by `crawl` to `directory`, `chunk_pages`
+        pages at a time, and return it opened.
+        """
+        pages = sorted(corpus)
+        ids = {page: n for n, page in enumerate(pages)}
+
+        def chunks():
+            for start in range(0, len(pages), chunk_pages):
+                sources = list()
+                targets = list()
+                for page in pages[start:start + chunk_pages]:
+                    for link in corpus[page]:
+                        sources.append(ids[page])
+                        targets.append(ids[link])
+                yield (np.array(sources, dtype=np.int64),
+                       np.array(targets, dtype=np.int64))
+
+        return cls.write(directory, pages, chunks)
+
+    @classmethod
+    def crawl(cls, corpus, directory, chunk_pages=CHUNK_PAGES, workers=None):
+        """
+        Parse the HTML pages in the `corpus` directory straight into an
+        edge list in `directory`, and return it opened.
+
+        Pages are parsed `chunk_pages` at a time, in a pool of `workers`
+        processes if given, and each chunk's links are spilled to disk as
+        page numbers, so only the page names are ever held in memory
+        rather than the whole corpus as returned by `crawl`.
+        """
+        from pagerank import parse_page
+
+        pages = sorted(
+            filename for filename in os.listdir(corpus)
+            if filename.endswith(".html")
+        )
+        ids = {page: n for n, page in enumerate(pages)}
+        os.makedirs(directory, exist_ok=True)
+        spilled = list()
+        executor = (
+            concurrent.futures.ProcessPoolExecutor(workers)
+            if workers else None
+        )
+        try:
+            for start in range(0, len(pages), chunk_pages):
+                chunk = pages[start:start + chunk_pages]
+                jobs = [(os.path.join(corpus, page), None) for page in chunk]
+                if executor is not None:
+                    results = executor.map(
+                        parse_page, jobs,
+                        chunksize=max(1, len(jobs) // (4 * workers))
+                    )
+                else:
+                    results = map(parse_page, jobs)
+
+                # Keep only links to other pages in the corpus
+                sources = list()
+                targets = list()
+                for source, (_, links) in zip(chunk, results):
+                    for link in links:
+                        if link in ids and link != source:
+                            sources.append(ids[source])
+                            targets.append(ids[link])
+                path = os.path.join(directory, f"chunk{len(spilled)}.npy")
+                np.save(path, np.array([sources, targets], dtype=np.int64)
+                        .reshape(2, -1))
+                spilled.append(path)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        def chunks():
+            for path in spilled:
+                links = np.load(path, mmap_mode="r")
+                yield links[0], links[1]
+
+        try:
+            return cls.write(directory, pages, chunks)
+        finally:
+            for path in spilled:
+                os.remove(path)
+
+    def __getstate__(self):
+        # A memory map should not be pickled, so edge lists are pickled as
+        # the directory to reopen
+        return {"directory": self.directory}
+
+    def __setstate__(self, state):
+        self.__dict__.update(EdgeList(state["directory"]).__dict__)
+
+    def __len__(self):
+        return self.size
+
+    def blocks(self, block_size=BLOCK_SIZE):
+        """
+        Generate `(sources, targets)` arrays for consecutive blocks of at
+        most `block_size` links.
+        """
+        for start in range(0, len(self.targets), block_size):
+            end = min(start + block_size, len(self.targets))
+            sources = np.searchsorted(
+                self.offsets, np.arange(start, end), side="right"
+            ) - 1
+            yield sources, np.asarray(self.targets[start:end], dtype=np.int64)
+
+    def pages(self):
+        """Return list of page names, in page number order."""
+        with open(os.path.join(self.directory, "pages.txt")) as f:
+            return f.read().splitlines()
+
+    def ranks(self, values):
+        """Return dict mapping each page name to its value in `values`."""
+        return {
+            page: float(value) for page, value in zip(self.pages(), values)
+        }
+
+
+def iterate(edges, damping_factor, tolerance=TOLERANCE,
+            max_iterations=MAX_ITERATIONS, block_size=BLOCK_SIZE):
+    """
+    Return `(ranks, iterations)` as for `sparse.iterate`, reading the links
+    from disk `block_size` at a time on every iteration.
+    """
+    n = len(edges)
+    ranks = np.full(n, 1 / n)
+    for iteration in range(1, max_iterations + 1):
+        share = np.divide(
+            ranks, edges.out_degree,
+            out=np.zeros(n), where=~edges.dangling
+        )
+        links = np.zeros(n)
+        for sources, targets in edges.blocks(block_size):
+            links += np.bincount(targets, weights=share[sources], minlength=n)
+        dangling = ranks[edges.dangling].sum()
+        new_ranks = (
+            (1 - damping_factor) / n
+            + damping_factor * (links + dangling / n)
+        )
+        converged = np.abs(new_ranks - ranks).sum() <= tolerance
+        ranks = new_ranks
+        if converged:
+            break
+    return ranks / ranks.sum(), iteration
@@ -1,3 +1,7 @@
+import argparse
+import concurrent.futures
+import hashlib
+import json
 import os
 import random
 import re
@@ -6,32 +10,214 @@ import sys
 DAMPING = 0.85
 SAMPLES = 10000
 
+LINK = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
-    print(f"PageRank Results from Sampling (n = {SAMPLES})")
+    if sys.argv[1:2] == ["compile"]:
+        return compile_corpus(sys.argv[2:])
+    parser = argparse.ArgumentParser(
+        usage="python pagerank.py corpus\n"
+              "       python pagerank.py compile corpus output.npz"
+    )
+    parser.add_argument(
+        "corpus", help="directory of HTML pages, or a compiled .npz file"
+    )
+    parser.add_argument(
+        "--sparse", action="store_true",
+        help="use the vectorized NumPy engines for both methods"
+    )
+    parser.add_argument(
+        "--tolerance", type=float,
+        help="L1 convergence tolerance for the sparse engine"
+    )
+    parser.add_argument(
+        "--max-iterations", type=int,
+        help="iteration limit for the sparse engine"
+    )
+    parser.add_argument(
+        "--samples", type=int, default=SAMPLES,
+        help=f"number of samples to take (default: {SAMPLES})"
+    )
+    parser.add_argument(
+        "--workers", type=int,
+        help="number of processes to parse pages with"
+    )
+    parser.add_argument(
+        "--manifest",
+        help="JSON file used to skip re-parsing pages that have not changed"
+    )
+    parser.add_argument(
+        "--target-error", type=float,
+        help=(
+            "with --sparse, sample in parallel until every page's 95%% "
+            "confidence interval is within this of its estimate"
+        )
+    )
+    parser.add_argument(
+        "--out-of-core", metavar="DIR",
+        help=(
+            "parse the corpus straight into an edge list on disk in DIR, "
+            "without holding its links in memory, and rank it from there "
+            "with the NumPy engines"
+        )
+    )
+    args = parser.parse_args()
+    engine = args.sparse or args.out_of_core is not None
+    for option, value in (("--tolerance", args.tolerance),
+                          ("--max-iterations", args.max_iterations),
+                          ("--target-error", args.target_error)):
+        if value is not None and not engine:
+            parser.error(f"{option} can only be used with --sparse")
+    compiled = os.path.isfile(args.corpus)
+    if args.out_of_core is not None:
+        if compiled or args.manifest:
+            parser.error(
+                "--out-of-core needs a corpus directory and no --manifest"
+            )
+        import outofcore
+        graph = outofcore.EdgeList.crawl(
+            args.corpus, args.out_of_core, workers=args.workers
+        )
+        args.sparse = True
+    elif compiled:
+        import sparse
+        graph = sparse.Graph.load(args.corpus)
+    else:
+        corpus = crawl(args.corpus, args.workers, args.manifest)
+    errors = None
+    samples = args.samples
+    if args.sparse:
+        import sparse
+        if args.out_of_core is None and not compiled:
+            graph = sparse.Graph.from_corpus(corpus)
+        if args.target_error is not None:
+            values, errors, samples = sparse.sample_parallel(
+                graph, DAMPING, args.samples,
+                workers=args.workers or os.cpu_count() or 1,
+                target_error=args.target_error
+            )
+            ranks = graph.ranks(values)
+            if errors is not None:
+                errors = graph.ranks(errors)
+        else:
+            ranks = graph.ranks(sparse.sample(graph, DAMPING, args.samples))
+    else:
+        if compiled:
+            corpus = graph.corpus()
+        ranks = sample_pagerank(corpus, DAMPING, args.samples)
+    print(f"PageRank Results from Sampling (n = {samples})")
     for page in sorted(ranks):
-        print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING)
-    print(f"PageRank Results from Iteration")
+        if errors is not None:
+            print(f"  {page}: {ranks[page]:.4f} ± {errors[page]:.4f}")
+        else:
+            print(f"  {page}: {ranks[page]:.4f}")
+    if args.sparse:
+        engine = outofcore if args.out_of_core is not None else sparse
+        values, iterations = engine.iterate(
+            graph, DAMPING,
+            tolerance=args.tolerance or sparse.TOLERANCE,
+            max_iterations=args.max_iterations or sparse.MAX_ITERATIONS
+        )
+        ranks = graph.ranks(values)
+        print(f"PageRank Results from Iteration ({iterations} iterations)")
+    else:
+        ranks = iterate_pagerank(corpus, DAMPING)
+        print(f"PageRank Results from Iteration")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
 
 
-def crawl(directory):
-    pages = dict()
+def compile_corpus(argv):
+    """
+    Crawl a corpus once and save its link graph to a `.npz` file, which
+    can be given in place of the corpus directory to skip parsing.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python pagerank.py compile",
+        usage="python pagerank.py compile corpus output.npz"
+    )
+    parser.add_argument("corpus")
+    parser.add_argument("output")
+    parser.add_argument(
+        "--workers", type=int,
+        help="number of processes to parse pages with"
+    )
+    parser.add_argument(
+        "--manifest",
+        help="JSON file used to skip re-parsing pages that have not changed"
+    )
+    args = parser.parse_args(argv)
+    import sparse
+    graph = sparse.Graph.from_corpus(
+        crawl(args.corpus, args.workers, args.manifest)
+    )
+    graph.save(args.output)
+    print(f"Compiled {len(graph)} pages and {len(graph.targets)} links "
+          f"to {args.output}")
 
-    # Extract all links from HTML files
+
+def crawl(directory, workers=None, manifest=None):
+    """
+    Return dict mapping each HTML page in `directory` to the set of other
+    pages in the directory that it links to.
+
+    If `workers` is given, pages are parsed in a pool of that many
+    processes. If `manifest` is given, it names a JSON file recording each
+    page's modification time, size, hash and links; pages whose time and
+    size, or else hash, are unchanged since the last crawl are not parsed
+    again, and the file is updated afterwards.
+    """
+    previous = dict()
+    if manifest is not None and os.path.exists(manifest):
+        with open(manifest) as f:
+            previous = json.load(f)
+
+    # Reuse the links of pages that have not been modified
+    entries = dict()
+    stale = list()
     for filename in os.listdir(directory):
         if not filename.endswith(".html"):
             continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
+        stat = os.stat(os.path.join(directory, filename))
+        entry = previous.get(filename)
+        if (entry is not None and entry["mtime"] == stat.st_mtime_ns
+                and entry["size"] == stat.st_size):
+            entries[filename] = entry
+        else:
+            stale.append((filename, stat))
+
+    # Extract all links from the other HTML files
+    jobs = [
+        (os.path.join(directory, filename),
+         previous.get(filename, {}).get("hash"))
+        for filename, _ in stale
+    ]
+    if workers:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            chunksize = max(1, len(jobs) // (4 * workers))
+            results = list(executor.map(parse_page, jobs, chunksize=chunksize))
+    else:
+        results = list(map(parse_page, jobs))
+    for (filename, stat), (digest, links) in zip(stale, results):
+        if links is None:
+            links = previous[filename]["links"]
+        entries[filename] = {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": digest,
+            "links": links
+        }
+
+    if manifest is not None:
+        temporary = f"{manifest}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(entries, f)
+        os.replace(temporary, manifest)
+
+    pages = dict()
+    for filename, entry in entries.items():
+        pages[filename] = set(entry["links"]) - {filename}
 
     # Only include links to other pages in the corpus
     for filename in pages:
@@ -43,6 +229,25 @@ def crawl(directory):
     return pages
 
 
+def parse_page(job):
+    """
+    Given the path to an HTML file and the hash it had when last parsed,
+    or None, return its current hash and the sorted list of links in it.
+    The links are None if the hash has not changed.
+    """
+    path, previous_hash = job
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == previous_hash:
+        return digest, None
+    contents = data.decode()
+    links = set(
+        match.group(1) for match in LINK.finditer(contents)
+    )
+    return digest, sorted(links)
+
+
 def transition_model(corpus, page, damping_factor):
     if len(corpus[page]) == 0:
         return {key: 1 / len(corpus) for key in corpus}
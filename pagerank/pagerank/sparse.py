@@ -0,0 +1,586 @@
+import math
+import multiprocessing
+import os
+
+from collections import deque
+
+import numpy as np
+
+# Iteration stops once the L1 distance between successive rank vectors is
+# at most TOLERANCE, or after MAX_ITERATIONS iterations
+TOLERANCE = 1e-6
+MAX_ITERATIONS = 100
+
+# Number of iterations from the uniform distribution taken to estimate how
+# fast iteration converges on a graph
+COLD_STEPS = 10
+
+# Residual pushing stops once no page's residual exceeds this fraction of
+# the tolerance
+PUSH_EPSILON = 0.01
+
+# Number of random surfers sampled side by side, reduced so that each
+# records at least CHAIN samples
+WALKERS = 4096
+CHAIN = 1000
+
+# Steps every surfer takes before its samples are recorded, so that where
+# it started no longer matters; the bias left is about d ** BURN_IN
+BURN_IN = 100
+
+# Samples taken by each process per round of parallel sampling, and the
+# number of batches needed before the error is estimated
+BATCH = 100000
+MIN_BATCHES = 8
+
+
+class Graph():
+
+    def __init__(self, pages, offsets, targets):
+        """
+        Create a link graph in compressed sparse row form.
+
+        Pages are numbered by their position in `pages`; the links out of
+        page `n` go to the pages numbered `targets[offsets[n]:offsets[n + 1]]`.
+        """
+        self.pages = list(pages)
+        self.ids = {page: n for n, page in enumerate(self.pages)}
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int64)
+        self.out_degree = np.diff(self.offsets)
+        self.dangling = self.out_degree == 0
+
+        # Source page of each link, for scattering rank along the links
+        self.sources = np.repeat(np.arange(len(self.pages)), self.out_degree)
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Return graph for a corpus as returned by `crawl`, mapping each page
+        to the set of pages it links to.
+        """
+        pages = sorted(corpus)
+        ids = {page: n for n, page in enumerate(pages)}
+        offsets = [0]
+        targets = list()
+        for page in pages:
+            targets.extend(sorted(ids[link] for link in corpus[page]))
+            offsets.append(len(targets))
+        return cls(pages, offsets, targets)
+
+    @classmethod
+    def from_edges(cls, pages, sources, targets):
+        """
+        Return graph with the given pages and links from `sources[k]` to
+        `targets[k]`, given as page numbers. Duplicate links and links from
+        a page to itself are dropped.
+        """
+        n = len(pages)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        keys = np.sort((sources * n + targets)[sources != targets])
+        keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+        sources, targets = np.divmod(keys, n)
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+        return cls(pages, offsets, targets)
+
+    def change(self, added_pages=(), removed_pages=(), added_links=(),
+               removed_links=()):
+        """
+        Return a new graph with pages and links added and removed. Links
+        are (source, target) pairs of page names; removing a page removes
+        its links too. Remaining pages keep their order, and added pages
+        are numbered after them.
+        """
+        removed = set(removed_pages)
+        pages = [page for page in self.pages if page not in removed]
+        kept = set(pages)
+        pages.extend(page for page in dict.fromkeys(added_pages)
+                     if page not in kept)
+        ids = {page: n for n, page in enumerate(pages)}
+        n = len(pages)
+
+        # Renumber existing links, dropping those of removed pages
+        renumber = np.array(
+            [ids.get(page, -1) for page in self.pages], dtype=np.int64
+        )
+        sources = renumber[self.sources]
+        targets = renumber[self.targets]
+        keep = (sources >= 0) & (targets >= 0)
+        sources = sources[keep]
+        targets = targets[keep]
+
+        if removed_links:
+            removed_keys = [
+                ids[source] * n + ids[target]
+                for source, target in removed_links
+                if source in ids and target in ids
+            ]
+            keep = ~np.isin(sources * n + targets, removed_keys)
+            sources = sources[keep]
+            targets = targets[keep]
+        if added_links:
+            added = np.array(
+                [(ids[source], ids[target])
+                 for source, target in added_links],
+                dtype=np.int64
+            ).reshape(-1, 2)
+            sources = np.concatenate([sources, added[:, 0]])
+            targets = np.concatenate([targets, added[:, 1]])
+        return Graph.from_edges(pages, sources, targets)
+
+    @classmethod
+    def load(cls, path):
+        """Return graph saved to the `.npz` file at `path` by `save`."""
+        with np.load(path) as data:
+            return cls(data["pages"].tolist(), data["offsets"],
+                       data["targets"])
+
+    def save(self, path):
+        """
+        Write graph to `path` as a `.npz` file holding the page names and
+        the CSR offsets and targets, so it can be loaded without crawling.
+        """
+        dtype = np.int32 if len(self.pages) < 2 ** 31 else np.int64
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            np.savez(
+                f, pages=np.array(self.pages, dtype=str),
+                offsets=self.offsets, targets=self.targets.astype(dtype)
+            )
+        os.replace(temporary, path)
+
+    def corpus(self):
+        """
+        Return dict mapping each page name to the set of pages it links to,
+        as returned by `crawl`.
+        """
+        offsets = self.offsets.tolist()
+        targets = self.targets.tolist()
+        return {
+            page: {self.pages[t] for t in targets[start:end]}
+            for page, start, end in zip(self.pages, offsets, offsets[1:])
+        }
+
+    def __len__(self):
+        return len(self.pages)
+
+    def link_matrix(self):
+        """
+        Return SciPy sparse matrix whose entry (t, s) is the probability
+        that a surfer on page `s` following a link goes to page `t`.
+        Columns of dangling pages are zero. Built once and cached.
+        """
+        from scipy.sparse import csr_matrix
+        if not hasattr(self, "matrix"):
+            n = len(self.pages)
+            weights = 1 / self.out_degree[self.sources]
+            self.matrix = csr_matrix(
+                (weights, (self.targets, self.sources)), shape=(n, n)
+            )
+        return self.matrix
+
+    def ranks(self, values):
+        """Return dict mapping each page name to its value in `values`."""
+        return {page: float(value) for page, value in zip(self.pages, values)}
+
+
+def step(graph, ranks, damping_factor):
+    """
+    Return the rank vector after one power iteration from `ranks`.
+
+    The rank of dangling pages, which is spread evenly over every page,
+    is handled as a single scalar.
+    """
+    n = len(graph)
+    share = np.divide(
+        ranks, graph.out_degree,
+        out=np.zeros(n), where=~graph.dangling
+    )
+    links = np.bincount(
+        graph.targets, weights=share[graph.sources], minlength=n
+    )
+    dangling = ranks[graph.dangling].sum()
+    return (1 - damping_factor) / n + damping_factor * (links + dangling / n)
+
+
+def iterate(graph, damping_factor, tolerance=TOLERANCE,
+            max_iterations=MAX_ITERATIONS, start=None, changes=None):
+    """
+    Return `(ranks, iterations)`, where `ranks` is the array of PageRank
+    values by page number, computed by power iteration from `start`, or
+    from the uniform distribution if `start` is None. If `changes` is a
+    list, the L1 change made by each iteration is appended to it.
+    """
+    n = len(graph)
+    ranks = np.full(n, 1 / n) if start is None else np.asarray(start, float)
+    for iteration in range(1, max_iterations + 1):
+        new_ranks = step(graph, ranks, damping_factor)
+        change = np.abs(new_ranks - ranks).sum()
+        if changes is not None:
+            changes.append(change)
+        converged = change <= tolerance
+        ranks = new_ranks
+        if converged:
+            break
+    return ranks / ranks.sum(), iteration
+
+
+def teleport_matrix(graph, seeds):
+    """
+    Return an array with one column per query, giving the probability of
+    teleporting to each page. Each element of `seeds` is either a dict
+    mapping pages to weights, or a collection of pages to weight equally.
+    """
+    teleports = np.zeros((len(graph), len(seeds)))
+    for column, pages in enumerate(seeds):
+        if not isinstance(pages, dict):
+            pages = dict.fromkeys(pages, 1)
+        for page, weight in pages.items():
+            teleports[graph.ids[page], column] = weight
+    totals = teleports.sum(axis=0)
+    if not totals.all():
+        raise ValueError("every query needs a page with positive weight")
+    return teleports / totals
+
+
+def personalized(graph, damping_factor, teleports, tolerance=TOLERANCE,
+                 max_iterations=MAX_ITERATIONS):
+    """
+    Compute personalized PageRank for a batch of queries together, with
+    one sparse matrix times dense matrix product per iteration (requires
+    SciPy).
+
+    `teleports` has one column per query, as returned by
+    `teleport_matrix`; a surfer who does not follow a link, or is on a
+    page without links, jumps to a page drawn from its query's column.
+    `tolerance` is either one L1 tolerance for every query or one per
+    query, and queries stop being iterated once they converge.
+
+    Return `(ranks, iterations)`: an array with one column of ranks per
+    query, and the number of iterations each query took.
+    """
+    teleports = np.asarray(teleports, dtype=float)
+    queries = teleports.shape[1]
+    tolerance = np.broadcast_to(np.asarray(tolerance, dtype=float), queries)
+    matrix = graph.link_matrix()
+
+    # Only the columns of queries still converging are iterated
+    ranks = np.empty_like(teleports)
+    iterations = np.zeros(queries, dtype=np.int64)
+    active = np.arange(queries)
+    current = teleports.copy()
+    for _ in range(max_iterations):
+        if not len(active):
+            break
+        dangling = current[graph.dangling].sum(axis=0)
+        new_ranks = matrix @ current
+        new_ranks *= damping_factor
+        jump = 1 - damping_factor + damping_factor * dangling
+        new_ranks += jump * teleports
+        change = np.abs(new_ranks - current).sum(axis=0)
+        iterations[active] += 1
+        current = new_ranks
+        converged = change <= tolerance[active]
+        if converged.any():
+            ranks[:, active[converged]] = current[:, converged]
+            active = active[~converged]
+            current = current[:, ~converged]
+            teleports = teleports[:, ~converged]
+    ranks[:, active] = current
+    return ranks / ranks.sum(axis=0), iterations
+
+
+def top(graph, ranks, k):
+    """
+    Return, for each column of `ranks`, a list of the `k` highest ranked
+    `(page, rank)` pairs in decreasing order of rank.
+    """
+    ranks = np.asarray(ranks)
+    k = min(k, len(graph))
+    results = list()
+    for column in ranks.T:
+        best = np.argpartition(-column, k - 1)[:k]
+        best = best[np.argsort(-column[best], kind="stable")]
+        results.append([(graph.pages[n], float(column[n])) for n in best])
+    return results
+
+
+def sample(graph, damping_factor, n, walkers=WALKERS, seed=None):
+    """
+    Return array of PageRank values by page number, estimated from `n`
+    samples of random surfers.
+
+    Up to `walkers` independent surfers, but few enough that each takes
+    at least `CHAIN` samples, start on uniformly random pages and take
+    `BURN_IN` steps before moving together, each sample step recording
+    every surfer's page. A surfer follows a uniformly chosen link with
+    probability `damping_factor`, and otherwise, or if its page has no
+    links, jumps to a uniformly random page.
+    """
+    rng = np.random.default_rng(seed)
+    walkers = max(1, min(walkers, n // CHAIN))
+    positions = rng.integers(0, len(graph), walkers)
+    positions = burn_in(graph, damping_factor, positions, rng)
+    counts, _ = walk(graph, damping_factor, n, positions, rng)
+    return counts / n
+
+
+def burn_in(graph, damping_factor, positions, rng, steps=BURN_IN):
+    """Return where surfers at `positions` are after `steps` steps."""
+    for _ in range(steps):
+        positions = move(graph, damping_factor, positions, rng)
+    return positions
+
+
+def move(graph, damping_factor, positions, rng):
+    """
+    Return where surfers at `positions` go next. Surfers that follow a
+    link pick one uniformly among their page's links; the rest jump to a
+    random page.
+    """
+    walkers = len(positions)
+    follow = (
+        (rng.random(walkers) < damping_factor)
+        & ~graph.dangling[positions]
+    )
+    links = positions[follow]
+    choices = graph.offsets[links] + (
+        rng.random(len(links)) * graph.out_degree[links]
+    ).astype(np.int64)
+    positions = rng.integers(0, len(graph), walkers)
+    positions[follow] = graph.targets[choices]
+    return positions
+
+
+def walk(graph, damping_factor, n, positions, rng):
+    """
+    Take `n` samples from surfers starting at `positions`, as described
+    for `sample`, and return `(counts, positions)`, the number of samples
+    on each page and where the surfers ended up.
+    """
+    size = len(graph)
+    walkers = len(positions)
+    counts = np.zeros(size, dtype=np.int64)
+    taken = 0
+    while taken < n:
+        recorded = min(walkers, n - taken)
+        counts += np.bincount(positions[:recorded], minlength=size)
+        taken += recorded
+        positions = move(graph, damping_factor, positions, rng)
+    return counts, positions
+
+
+def sample_parallel(graph, damping_factor, n, workers, target_error=None,
+                    confidence=0.95, batch=BATCH, walkers=WALKERS,
+                    seed=None):
+    """
+    Estimate PageRank from up to `n` samples, taken in rounds of up to
+    `batch` samples by each of `workers` processes, each with its own
+    independent random stream derived from `seed`. Batches are made small
+    enough that `n` samples make at least `MIN_BATCHES` of them, so that
+    the target can be checked before the budget runs out.
+
+    Each process's surfers are burned in as for `sample`, and are few
+    enough that each takes at least `CHAIN` samples per round. Each
+    batch's estimate is treated as one observation, and the spread of
+    the batch estimates gives a confidence interval for every page. If
+    `target_error` is given, sampling stops as soon as every interval's
+    half-width is at most `target_error`.
+
+    Return `(ranks, errors, samples)`: the estimates and half-widths of
+    their `confidence` intervals, by page number, and the samples taken.
+    """
+    streams = [
+        np.random.default_rng(stream)
+        for stream in np.random.SeedSequence(seed).spawn(workers)
+    ]
+    batch = max(1, min(batch, -(-n // (workers * MIN_BATCHES))))
+    walkers = max(1, min(walkers, batch // CHAIN))
+    states = [
+        (rng, rng.integers(0, len(graph), walkers)) for rng in streams
+    ]
+    estimates = list()
+    samples = 0
+    steps = BURN_IN
+    with multiprocessing.Pool(
+        workers, initializer=init_worker, initargs=(graph, damping_factor)
+    ) as pool:
+        while samples < n:
+            size = min(batch, -(-(n - samples) // workers))
+            results = pool.map(walk_batch, [
+                (size, steps, rng, positions) for rng, positions in states
+            ])
+            steps = 0
+            states = list()
+            for counts, rng, positions in results:
+                estimates.append(counts / size)
+                states.append((rng, positions))
+                samples += size
+            if target_error is not None and len(estimates) >= MIN_BATCHES:
+                if half_widths(estimates, confidence).max() <= target_error:
+                    break
+    estimates = np.array(estimates)
+    errors = half_widths(estimates, confidence) if len(estimates) > 1 else None
+    return estimates.mean(axis=0), errors, samples
+
+
+def half_widths(estimates, confidence):
+    """
+    Return the half-widths of `confidence` intervals for the means of the
+    batch estimates, using Student's t distribution since there may be
+    only a few batches (requires SciPy).
+    """
+    from scipy.stats import t
+    estimates = np.asarray(estimates)
+    k = len(estimates)
+    quantile = t.ppf((1 + confidence) / 2, k - 1)
+    return quantile * estimates.std(axis=0, ddof=1) / math.sqrt(k)
+
+
+# Graph and damping factor used by the sampling processes
+GRAPH = None
+DAMPING = None
+
+
+def init_worker(graph, damping_factor):
+    global GRAPH, DAMPING
+    GRAPH = graph
+    DAMPING = damping_factor
+
+
+def walk_batch(job):
+    """
+    Take one batch of samples in a worker process, after `steps` steps of
+    burn-in, returning the counts and the random stream and surfer
+    positions to continue from.
+    """
+    size, steps, rng, positions = job
+    positions = burn_in(GRAPH, DAMPING, positions, rng, steps)
+    counts, positions = walk(GRAPH, DAMPING, size, positions, rng)
+    return counts, rng, positions
+
+
+def update(graph, ranks, damping_factor, added_pages=(), removed_pages=(),
+           added_links=(), removed_links=(), tolerance=TOLERANCE,
+           max_iterations=MAX_ITERATIONS, push=False, measure=False):
+    """
+    Apply a change to `graph`, as for `Graph.change`, and re-converge
+    PageRank starting from `ranks`, the previous result for `graph`.
+
+    Return `(graph, ranks, report)` for the changed graph. If `push` is
+    true, the residual is first pushed out from the pages it is
+    concentrated on, which suits changes to a few pages in a large graph.
+    `report` gives the number of `pushes` and power `iterations` done.
+    If `measure` is true, it also gives `saved`, the number of iterations
+    saved compared with actually iterating from the uniform distribution;
+    otherwise it gives `estimated_saved`, using `cold_iterations`.
+    """
+    changed = graph.change(
+        added_pages, removed_pages, added_links, removed_links
+    )
+
+    # Carry over the old ranks, giving new pages none yet
+    n = len(changed)
+    ranks = np.asarray(ranks, dtype=float)
+    start = np.zeros(n)
+    new = np.ones(n, dtype=bool)
+    for page, rank in zip(graph.pages, ranks):
+        if page in changed.ids:
+            start[changed.ids[page]] = rank
+            new[changed.ids[page]] = False
+
+    # Scale them so that every page gets the same share of the random jumps
+    # as before, which new pages start with, so that the residual is left
+    # only near the change rather than spread over every page. The total
+    # is then no longer 1, which pushing corrects but iteration would take
+    # many steps to, so without pushing the ranks are renormalized instead
+    share = (
+        1 - damping_factor
+        + damping_factor * ranks[graph.dangling].sum()
+    ) / len(graph)
+    scale = (1 - damping_factor) / (
+        share * n
+        - damping_factor * start[changed.dangling].sum()
+        - damping_factor * share * (new & changed.dangling).sum()
+    )
+    start *= scale
+    start[new] = scale * share
+
+    pushes = 0
+    if push:
+        start, pushes = push_residual(
+            changed, start, damping_factor, tolerance * PUSH_EPSILON
+        )
+    else:
+        start /= start.sum()
+    ranks, iterations = iterate(
+        changed, damping_factor, tolerance, max_iterations, start
+    )
+    report = {"iterations": iterations, "pushes": pushes}
+    if measure:
+        _, cold = iterate(changed, damping_factor, tolerance, max_iterations)
+        report["saved"] = max(0, cold - iterations)
+    else:
+        cold = cold_iterations(changed, damping_factor, tolerance)
+        report["estimated_saved"] = max(0, cold - iterations)
+    return changed, ranks, report
+
+
+def push_residual(graph, ranks, damping_factor, epsilon):
+    """
+    Return `(ranks, pushes)`, where `ranks` has been corrected by pushing
+    the residual of every page whose residual exceeds `epsilon` onto its
+    own rank and along its links, until no page's residual does.
+
+    Only pages near the change are touched, apart from the rank pushed out
+    of dangling pages, which is spread over every page at the end.
+    """
+    n = len(graph)
+    ranks = ranks.copy()
+    residual = step(graph, ranks, damping_factor) - ranks
+    spread = 0
+    queue = deque(np.flatnonzero(np.abs(residual) > epsilon).tolist())
+    queued = set(queue)
+    pushes = 0
+    while queue:
+        page = queue.popleft()
+        queued.discard(page)
+        amount = residual[page]
+        ranks[page] += amount
+        residual[page] = 0
+        pushes += 1
+        if graph.dangling[page]:
+            spread += damping_factor * amount / n
+            continue
+        links = graph.targets[graph.offsets[page]:graph.offsets[page + 1]]
+        residual[links] += damping_factor * amount / len(links)
+        for target in links[np.abs(residual[links]) > epsilon].tolist():
+            if target not in queued:
+                queue.append(target)
+                queued.add(target)
+    ranks += spread
+    return ranks / ranks.sum(), pushes
+
+
+def cold_iterations(graph, damping_factor, tolerance, steps=COLD_STEPS):
+    """
+    Estimate how many iterations `iterate` takes from the uniform
+    distribution, by taking the first `steps` of them and assuming the
+    change then keeps shrinking at its average rate over the second half
+    of those steps. The change shrinks faster in the first few.
+    """
+    changes = list()
+    _, iterations = iterate(
+        graph, damping_factor, tolerance, steps, changes=changes
+    )
+    if changes[-1] <= tolerance or len(changes) < 2:
+        return iterations
+    half = len(changes) // 2
+    rate = (changes[-1] / changes[half - 1]) ** (1 / (len(changes) - half))
+    if not 0 < rate < 1:
+        return iterations
+    return iterations + math.ceil(
+        math.log(tolerance / changes[-1]) / math.log(rate)
+    )